@@ -0,0 +1,98 @@
+"""mealplan meal relationships
+
+Revision ID: 2f0d4739db73
+Revises: 9c08437270d3
+Create Date: 2026-10-18 18:24:40.581346
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "2f0d4739db73"
+down_revision: Union[str, None] = "9c08437270d3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    snacks_table = op.create_table(
+        "mealplan_snacks",
+        sa.Column(
+            "mealplan_id",
+            sa.Integer(),
+            sa.ForeignKey("mealplans.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column(
+            "meal_id",
+            sa.Integer(),
+            sa.ForeignKey("meals.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+    )
+    op.create_index("ix_mealplan_snacks_meal_id", "mealplan_snacks", ["meal_id"])
+
+    # snacks held a free-form list of meal ids; keep the ones that still exist.
+    connection = op.get_bind()
+    meal_ids = set(connection.execute(sa.text("SELECT id FROM meals")).scalars())
+    rows = connection.execute(
+        sa.text("SELECT id, snacks FROM mealplans WHERE snacks IS NOT NULL")
+    ).all()
+    links = {
+        (mealplan_id, int(meal_id))
+        for mealplan_id, snacks in rows
+        for meal_id in re.findall(r"\d+", snacks)
+        if int(meal_id) in meal_ids
+    }
+    if links:
+        op.bulk_insert(
+            snacks_table,
+            [
+                {"mealplan_id": mealplan_id, "meal_id": meal_id}
+                for mealplan_id, meal_id in sorted(links)
+            ],
+        )
+
+    with op.batch_alter_table("mealplans") as batch_op:
+        batch_op.drop_column("snacks")
+        for slot in ("breakfast", "lunch", "dinner"):
+            batch_op.alter_column(slot, new_column_name=f"{slot}_id")
+    with op.batch_alter_table("mealplans") as batch_op:
+        for slot in ("breakfast", "lunch", "dinner"):
+            batch_op.create_foreign_key(
+                f"fk_mealplans_{slot}_id_meals", "meals", [f"{slot}_id"], ["id"]
+            )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("mealplans") as batch_op:
+        for slot in ("breakfast", "lunch", "dinner"):
+            batch_op.drop_constraint(
+                f"fk_mealplans_{slot}_id_meals", type_="foreignkey"
+            )
+    with op.batch_alter_table("mealplans") as batch_op:
+        for slot in ("breakfast", "lunch", "dinner"):
+            batch_op.alter_column(f"{slot}_id", new_column_name=slot)
+        batch_op.add_column(sa.Column("snacks", sa.String(), nullable=True))
+
+    connection = op.get_bind()
+    snacks: dict[int, list[str]] = {}
+    for mealplan_id, meal_id in connection.execute(
+        sa.text("SELECT mealplan_id, meal_id FROM mealplan_snacks ORDER BY meal_id")
+    ):
+        snacks.setdefault(mealplan_id, []).append(str(meal_id))
+    if snacks:
+        connection.execute(
+            sa.text("UPDATE mealplans SET snacks = :snacks WHERE id = :mealplan_id"),
+            [
+                {"mealplan_id": mealplan_id, "snacks": ",".join(meal_ids)}
+                for mealplan_id, meal_ids in snacks.items()
+            ],
+        )
+    op.drop_index("ix_mealplan_snacks_meal_id", table_name="mealplan_snacks")
+    op.drop_table("mealplan_snacks")
@@ -0,0 +1,42 @@
+"""settings version and mealplan updated_at
+
+Revision ID: 4d7a2e91c6b5
+Revises: 2f0d4739db73
+Create Date: 2026-10-18 19:12:05.217640
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4d7a2e91c6b5"
+down_revision: Union[str, None] = "2f0d4739db73"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+mealplans = sa.table("mealplans", sa.column("updated_at", sa.DateTime))
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("settings") as batch_op:
+        batch_op.add_column(
+            sa.Column("version", sa.Integer(), nullable=False, server_default="1")
+        )
+
+    op.add_column("mealplans", sa.Column("updated_at", sa.DateTime()))
+    # Written from Python so the values use the same format as the ORM's.
+    op.get_bind().execute(mealplans.update().values(updated_at=datetime.utcnow()))
+    with op.batch_alter_table("mealplans") as batch_op:
+        batch_op.alter_column("updated_at", existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("mealplans") as batch_op:
+        batch_op.drop_column("updated_at")
+    with op.batch_alter_table("settings") as batch_op:
+        batch_op.drop_column("version")
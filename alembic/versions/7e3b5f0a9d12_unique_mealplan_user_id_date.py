@@ -0,0 +1,55 @@
+"""unique mealplan (user_id, date)
+
+Revision ID: 7e3b5f0a9d12
+Revises: 4d7a2e91c6b5
+Create Date: 2026-10-18 20:03:47.915208
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7e3b5f0a9d12"
+down_revision: Union[str, None] = "4d7a2e91c6b5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+mealplans = sa.table(
+    "mealplans",
+    sa.column("id", sa.Integer),
+    sa.column("user_id", sa.Integer),
+    sa.column("date", sa.Date),
+)
+mealplan_snacks = sa.table("mealplan_snacks", sa.column("mealplan_id", sa.Integer))
+
+
+def upgrade() -> None:
+    # Keep the most recent plan (highest id) of each user and day. Snacks are
+    # deleted explicitly: SQLite only cascades with foreign keys enabled.
+    duplicate = mealplans.alias("duplicate")
+    later = mealplans.alias("later")
+    duplicates = sa.select(duplicate.c.id).where(
+        sa.exists().where(
+            later.c.user_id == duplicate.c.user_id,
+            later.c.date == duplicate.c.date,
+            later.c.id > duplicate.c.id,
+        )
+    )
+    op.execute(
+        mealplan_snacks.delete().where(mealplan_snacks.c.mealplan_id.in_(duplicates))
+    )
+    op.execute(mealplans.delete().where(mealplans.c.id.in_(duplicates)))
+
+    op.drop_index("ix_mealplans_user_id_date", table_name="mealplans")
+    op.create_index(
+        "ix_mealplans_user_id_date", "mealplans", ["user_id", "date"], unique=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_mealplans_user_id_date", table_name="mealplans")
+    op.create_index("ix_mealplans_user_id_date", "mealplans", ["user_id", "date"])
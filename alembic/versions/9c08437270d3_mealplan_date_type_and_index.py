@@ -0,0 +1,69 @@
+"""mealplan date type and (user_id, date) index
+
+Revision ID: 9c08437270d3
+Revises: cefa7c4eb298
+Create Date: 2026-10-18 17:58:12.402117
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9c08437270d3"
+down_revision: Union[str, None] = "cefa7c4eb298"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+mealplans = sa.table(
+    "mealplans",
+    sa.column("id", sa.Integer),
+    sa.column("date", sa.String),
+    sa.column("plan_date", sa.Date),
+)
+
+
+def upgrade() -> None:
+    # Parse the free-form strings into a new Date column and swap it in, rather than
+    # changing the type in place: SQLite's batch copy would CAST the strings to
+    # DATE, which has numeric affinity and keeps only the year.
+    op.add_column("mealplans", sa.Column("plan_date", sa.Date()))
+
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select(mealplans.c.id, mealplans.c.date).where(mealplans.c.date.is_not(None))
+    ).all()
+    updates = []
+    for row_id, value in rows:
+        try:
+            parsed = datetime.fromisoformat(value.strip()).date()
+        except ValueError as error:
+            raise ValueError(
+                f"mealplans row {row_id} has an unparseable date: {value!r}"
+            ) from error
+        updates.append({"row_id": row_id, "parsed_date": parsed})
+    if updates:
+        connection.execute(
+            mealplans.update()
+            .where(mealplans.c.id == sa.bindparam("row_id"))
+            .values(plan_date=sa.bindparam("parsed_date")),
+            updates,
+        )
+
+    with op.batch_alter_table("mealplans") as batch_op:
+        batch_op.drop_index("ix_mealplans_user_id")
+        batch_op.drop_column("date")
+    with op.batch_alter_table("mealplans") as batch_op:
+        batch_op.alter_column("plan_date", new_column_name="date")
+    op.create_index("ix_mealplans_user_id_date", "mealplans", ["user_id", "date"])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("mealplans") as batch_op:
+        batch_op.drop_index("ix_mealplans_user_id_date")
+        batch_op.create_index("ix_mealplans_user_id", ["user_id"])
+        batch_op.alter_column("date", type_=sa.String(), existing_type=sa.Date())
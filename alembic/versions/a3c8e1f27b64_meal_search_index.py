@@ -0,0 +1,78 @@
+"""meal search index
+
+Revision ID: a3c8e1f27b64
+Revises: 7e3b5f0a9d12
+Create Date: 2026-10-18 20:41:26.503318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a3c8e1f27b64"
+down_revision: Union[str, None] = "7e3b5f0a9d12"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SQLITE_UPGRADE = (
+    """
+    CREATE VIRTUAL TABLE meals_fts USING fts5(
+        name, description, meal_type, user_id,
+        content='meals', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3 4 5 6 7'
+    )
+    """,
+    """
+    CREATE TRIGGER meals_fts_insert AFTER INSERT ON meals BEGIN
+        INSERT INTO meals_fts (rowid, name, description, meal_type, user_id)
+        VALUES (new.id, new.name, new.description, new.meal_type, new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER meals_fts_delete AFTER DELETE ON meals BEGIN
+        INSERT INTO meals_fts (meals_fts, rowid, name, description, meal_type, user_id)
+        VALUES ('delete', old.id, old.name, old.description, old.meal_type, old.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER meals_fts_update AFTER UPDATE ON meals BEGIN
+        INSERT INTO meals_fts (meals_fts, rowid, name, description, meal_type, user_id)
+        VALUES ('delete', old.id, old.name, old.description, old.meal_type, old.user_id);
+        INSERT INTO meals_fts (rowid, name, description, meal_type, user_id)
+        VALUES (new.id, new.name, new.description, new.meal_type, new.user_id);
+    END
+    """,
+    # Index the existing meals.
+    "INSERT INTO meals_fts (meals_fts) VALUES ('rebuild')",
+)
+SQLITE_DOWNGRADE = (
+    "DROP TRIGGER meals_fts_update",
+    "DROP TRIGGER meals_fts_delete",
+    "DROP TRIGGER meals_fts_insert",
+    "DROP TABLE meals_fts",
+)
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for statement in SQLITE_UPGRADE:
+            op.execute(statement)
+    elif dialect == "postgresql":
+        op.execute(
+            "CREATE INDEX ix_meals_search ON meals USING gin "
+            "(to_tsvector('simple', coalesce(name, '') || ' ' "
+            "|| coalesce(description, '')))"
+        )
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for statement in SQLITE_DOWNGRADE:
+            op.execute(statement)
+    elif dialect == "postgresql":
+        op.execute("DROP INDEX ix_meals_search")
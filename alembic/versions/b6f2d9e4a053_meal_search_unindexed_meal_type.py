@@ -0,0 +1,43 @@
+"""meal search unindexed meal_type
+
+Revision ID: b6f2d9e4a053
+Revises: e8a4c6d2f951
+Create Date: 2026-10-19 09:14:37.582104
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b6f2d9e4a053"
+down_revision: Union[str, None] = "e8a4c6d2f951"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# The triggers only name the columns, so they survive the table being recreated.
+CREATE_MEALS_FTS = """
+    CREATE VIRTUAL TABLE meals_fts USING fts5(
+        name, description, meal_type{meal_type_option}, user_id,
+        content='meals', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3 4 5 6 7'
+    )
+"""
+
+
+def recreate_meals_fts(meal_type_option: str) -> None:
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    op.execute("DROP TABLE meals_fts")
+    op.execute(CREATE_MEALS_FTS.format(meal_type_option=meal_type_option))
+    op.execute("INSERT INTO meals_fts (meals_fts) VALUES ('rebuild')")
+
+
+def upgrade() -> None:
+    recreate_meals_fts(" UNINDEXED")
+
+
+def downgrade() -> None:
+    recreate_meals_fts("")
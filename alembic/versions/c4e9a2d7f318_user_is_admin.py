@@ -0,0 +1,34 @@
+"""user is_admin and (is_active, id) index
+
+Revision ID: c4e9a2d7f318
+Revises: 5b2d8f4c1e07
+Create Date: 2026-10-18 22:14:37.608215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4e9a2d7f318"
+down_revision: Union[str, None] = "5b2d8f4c1e07"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                "is_admin", sa.Boolean(), nullable=False, server_default=sa.false()
+            )
+        )
+    op.create_index("ix_users_is_active_id", "users", ["is_active", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_is_active_id", table_name="users")
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("is_admin")
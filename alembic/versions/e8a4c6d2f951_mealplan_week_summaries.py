@@ -0,0 +1,88 @@
+"""mealplan week summaries
+
+Revision ID: e8a4c6d2f951
+Revises: c4e9a2d7f318
+Create Date: 2026-10-18 23:52:14.306517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e8a4c6d2f951"
+down_revision: Union[str, None] = "c4e9a2d7f318"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# The Monday starting the week of a plan's date, by dialect.
+WEEK_START = {
+    "sqlite": "date({date}, 'weekday 0', '-6 days')",
+    "postgresql": "CAST(date_trunc('week', {date}) AS DATE)",
+}
+
+# Summarizes the existing plans, as `crud.refresh_meal_plan_week_summaries` would.
+BACKFILL = """
+    INSERT INTO mealplan_week_summaries (
+        user_id, week_start, days_planned, breakfasts, lunches, dinners, snacks,
+        distinct_meals
+    )
+    SELECT
+        user_id,
+        week_start,
+        count(CASE WHEN slot = 'day' THEN 1 END),
+        count(CASE WHEN slot = 'breakfast' THEN 1 END),
+        count(CASE WHEN slot = 'lunch' THEN 1 END),
+        count(CASE WHEN slot = 'dinner' THEN 1 END),
+        count(CASE WHEN slot = 'snack' THEN 1 END),
+        count(DISTINCT meal_id)
+    FROM (
+        SELECT user_id, {week} AS week_start, 'day' AS slot, NULL AS meal_id
+        FROM mealplans
+        UNION ALL
+        SELECT user_id, {week}, 'breakfast', breakfast_id
+        FROM mealplans WHERE breakfast_id IS NOT NULL
+        UNION ALL
+        SELECT user_id, {week}, 'lunch', lunch_id
+        FROM mealplans WHERE lunch_id IS NOT NULL
+        UNION ALL
+        SELECT user_id, {week}, 'dinner', dinner_id
+        FROM mealplans WHERE dinner_id IS NOT NULL
+        UNION ALL
+        SELECT mealplans.user_id, {snack_week}, 'snack', mealplan_snacks.meal_id
+        FROM mealplans
+        JOIN mealplan_snacks ON mealplan_snacks.mealplan_id = mealplans.id
+    ) AS slots
+    WHERE user_id IS NOT NULL AND week_start IS NOT NULL
+    GROUP BY user_id, week_start
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        "mealplan_week_summaries",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("week_start", sa.Date(), nullable=False),
+        sa.Column("days_planned", sa.Integer(), nullable=False),
+        sa.Column("breakfasts", sa.Integer(), nullable=False),
+        sa.Column("lunches", sa.Integer(), nullable=False),
+        sa.Column("dinners", sa.Integer(), nullable=False),
+        sa.Column("snacks", sa.Integer(), nullable=False),
+        sa.Column("distinct_meals", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("user_id", "week_start"),
+    )
+    week_start = WEEK_START.get(op.get_bind().dialect.name)
+    if week_start is not None:
+        op.execute(
+            BACKFILL.format(
+                week=week_start.format(date="date"),
+                snack_week=week_start.format(date="mealplans.date"),
+            )
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("mealplan_week_summaries")
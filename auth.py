@@ -1,21 +1,40 @@
+import functools
+import math
 import os
+import time
+import uuid
 from datetime import datetime, timedelta
 from typing import Annotated
 
-from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-
-from .crud.users import get_user_by_username as get_user
-from .database import get_db
+from sqlalchemy import event, inspect
+
+from . import crud, models
+from .cache import TTLCache
+from .crud.aio import get_user_by_username as get_user
+from .database import DBSession, env_flag, get_async_db, state_path
+from .metrics import JWT_DURATION, LOGIN_THROTTLED, register_cache
+from .ratelimit import call_limiter, make_limiter
+from .revocation import revoked_tokens
+from .hashing import get_password_hash, password_hasher, pwd_context, verify_password
 from .schemas.users import User
 
-SECRET_KEY = os.getenv("SECRET_KEY", "secret")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 300
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+
+LOGIN_THROTTLING = env_flag("LOGIN_THROTTLING", True)
+LOGIN_RATE_LIMIT_BACKEND = os.getenv("LOGIN_RATE_LIMIT_BACKEND", "memory")
+LOGIN_RATE_LIMIT_PATH = os.getenv("LOGIN_RATE_LIMIT_PATH") or state_path("login_limits")
+LOGIN_RATE_LIMIT_SIZE = int(os.getenv("LOGIN_RATE_LIMIT_SIZE", "100000"))
+LOGIN_USERNAME_BURST = int(os.getenv("LOGIN_USERNAME_BURST", "5"))
+LOGIN_USERNAME_PER_MINUTE = float(os.getenv("LOGIN_USERNAME_PER_MINUTE", "1"))
+LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", "20"))
+LOGIN_IP_PER_MINUTE = float(os.getenv("LOGIN_IP_PER_MINUTE", "10"))
 
 
 class Token(BaseModel):
@@ -28,58 +47,153 @@ class TokenData(BaseModel):
     username: str | None = None
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+@functools.cache
+def secret_key() -> str:
+    """
+    Returns the key tokens are signed with, read from `SECRET_KEY` on first use so
+    that it may be set after this module is imported.
+
+    Returns:
+        str: The signing key.
     """
-    Verifies that the plain password matches the hashed password.
+    return os.getenv("SECRET_KEY", "secret")
+
+
+# Resolved users keyed by token subject, so authenticated requests skip the lookup.
+# Kept per process: invalidation only reaches the process that made the change, so
+# with several workers a deactivated user stays authenticated on the others for up
+# to PRINCIPAL_CACHE_TTL. Lower it where that matters, or set it to 0.
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+register_cache("principal", principal_cache)
+
+
+# Login attempts per username and per client address, checked before any database
+# or bcrypt work. Each has its own table in the "sqlite" backend's file, so that
+# LOGIN_RATE_LIMIT_SIZE bounds each and a flood of one doesn't evict the other.
+login_limits = {
+    "ip": make_limiter(
+        LOGIN_RATE_LIMIT_BACKEND,
+        rate=LOGIN_IP_PER_MINUTE / 60,
+        burst=LOGIN_IP_BURST,
+        maxsize=LOGIN_RATE_LIMIT_SIZE,
+        path=LOGIN_RATE_LIMIT_PATH,
+        name="login_ip",
+    ),
+    "username": make_limiter(
+        LOGIN_RATE_LIMIT_BACKEND,
+        rate=LOGIN_USERNAME_PER_MINUTE / 60,
+        burst=LOGIN_USERNAME_BURST,
+        maxsize=LOGIN_RATE_LIMIT_SIZE,
+        path=LOGIN_RATE_LIMIT_PATH,
+        name="login_username",
+    ),
+}
+
+
+def _login_limit_key(limit: str, value: str) -> str:
+    # Bounded, so that huge form fields don't become huge keys.
+    return f"{limit}:{value[:256]}"
+
+
+async def throttle_login(
+    request: Request,
+    form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+) -> None:
+    """
+    Rejects the attempt if its client address or username has made too many.
 
     Args:
-        plain_password (str): The plain password.
-        hashed_password (str): The hashed password.
+        request (Request): The request.
+        form_data (OAuth2PasswordRequestForm): The login form.
 
-    Returns:
-        bool: True if the plain password matches the hashed password, False otherwise.
+    Raises:
+        HTTPException: 429, with a `Retry-After` header, if a limit is exceeded.
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    if not LOGIN_THROTTLING:
+        return
+
+    # Behind a reverse proxy, this is the client only if `serve` trusts the proxy
+    # (--forwarded-allow-ips); otherwise every client shares the proxy's bucket.
+    client = request.client.host if request.client else "unknown"
+    # The address first, so that a throttled client doesn't use up the
+    # username's attempts too.
+    for limit, value in (("ip", client), ("username", form_data.username)):
+        limiter = login_limits[limit]
+        wait = await call_limiter(
+            limiter, limiter.acquire, _login_limit_key(limit, value)
+        )
+        if wait:
+            LOGIN_THROTTLED.inc(limit)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login attempts",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
 
 
-def get_password_hash(password: str) -> str:
+async def reset_login_throttle(username: str) -> None:
     """
-    Returns the hashed password.
+    Refills the username's login attempts, after a successful login, so that
+    earlier typos don't count against the user.
 
     Args:
-        password (str): The password to hash.
+        username (str): The username that logged in.
+    """
+    limiter = login_limits["username"]
+    await call_limiter(limiter, limiter.reset, _login_limit_key("username", username))
 
-    Returns:
-        str: The hashed password.
+
+def invalidate_principal(username: str) -> None:
     """
-    return pwd_context.hash(password)
+    Drops the cached user for the username, so the next request reloads it.
 
+    Call this whenever a user's `is_active` flag or profile changes outside the ORM;
+    ORM updates and deletes of `models.User` invalidate automatically. Other worker
+    processes keep their entry until it expires.
 
-def authenticate_user(db: Session, username: str, password: str):
+    Args:
+        username (str): The username of the user to drop.
+    """
+    principal_cache.delete(username)
+
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_changed_principal(mapper, connection, target) -> None:
+    invalidate_principal(target.username)
+    for username in inspect(target).attrs.username.history.deleted:
+        invalidate_principal(username)
+
+
+async def authenticate_user(db: DBSession, username: str, password: str):
     """
     Authenticates the user with the specified username and password.
 
     Args:
-        db (dict): The database of users.
+        db (Session | AsyncSession): The database session.
         username (str): The username of the user to authenticate.
         password (str): The password of the user to authenticate.
 
     Returns:
         UserInDB | None: The user with the specified username and password, or None if no user has the specified username or the password is incorrect.
+        Outdated password hashes are replaced after a successful check.
     """
-    print(username)
-    user = get_user(db, username=username)
+    user = await get_user(db, username=username)
     if not user:
         return None
-    print(user)
 
-    if not verify_password(password, user.hashed_password):  # type: ignore
+    verified, new_hash = await password_hasher.verify_and_update(
+        password, user.hashed_password  # type: ignore
+    )
+    if not verified:
         return None
+    if new_hash is not None:
+        # The hash predates the current BCRYPT_ROUNDS; the password is at hand, so
+        # upgrade it now rather than in a migration.
+        await crud.aio.update_user_password_hash(db, user.id, new_hash)
 
     return user
 
@@ -101,24 +215,29 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
-    to_encode.update({"exp": expire})
+    # A unique ID, so that this token can be revoked on its own.
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
 
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    start = time.perf_counter()
+    encoded_jwt = jwt.encode(to_encode, secret_key(), algorithm=ALGORITHM)
+    JWT_DURATION.observe(time.perf_counter() - start, "encode")
     return encoded_jwt
 
 
-async def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)],
-    db: Annotated[Session, Depends(get_db)],
-) -> User:
+async def get_token_payload(token: Annotated[str, Depends(oauth2_scheme)]) -> dict:
     """
-    Returns the current user.
+    Returns the claims of a valid, unrevoked access token.
+
+    Revocation is checked against the in-memory `revoked_tokens`, without a query.
 
     Args:
         token (str): The access token.
 
     Returns:
-        User: The current user.
+        dict: The token's claims.
+
+    Raises:
+        HTTPException: If the token is invalid, expired or revoked.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -126,21 +245,47 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+    start = time.perf_counter()
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str | None = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
+        payload = jwt.decode(token, secret_key(), algorithms=[ALGORITHM])
     except JWTError:
         raise credentials_exception  # pylint: disable=raise-missing-from
+    finally:
+        JWT_DURATION.observe(time.perf_counter() - start, "decode")
 
-    if token_data.username is None:
-        raise credentials_exception
-    user = get_user(db, username=token_data.username)
-    if user is None:
+    if payload.get("sub") is None or payload.get("jti") in revoked_tokens:
         raise credentials_exception
+    return payload
+
 
+async def get_current_user(
+    payload: Annotated[dict, Depends(get_token_payload)],
+    db: Annotated[DBSession, Depends(get_async_db)],
+) -> User:
+    """
+    Returns the current user.
+
+    Args:
+        payload (dict): The claims of the access token.
+
+    Returns:
+        User: The current user.
+    """
+    token_data = TokenData(username=payload["sub"])
+    user = principal_cache.get(token_data.username)
+    if user is not None:
+        return user
+
+    db_user = await get_user(db, username=token_data.username)
+    if db_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    user = User.model_validate(db_user)
+    principal_cache.set(token_data.username, user)
     return user
 
 
@@ -165,3 +310,26 @@ def get_current_active_user(
         )
 
     return current_user
+
+
+def get_current_admin_user(
+    current_user: Annotated[User, Depends(get_current_active_user)]
+) -> User:
+    """
+    Returns the current active user, if they are an administrator.
+
+    Args:
+        current_user (User): The current active user.
+
+    Returns:
+        User: The current administrator.
+
+    Raises:
+        HTTPException: If the current user is not an administrator.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Administrators only"
+        )
+
+    return current_user
@@ -0,0 +1,346 @@
+"""
+End-to-end load test of the API.
+
+Seeds a temporary SQLite database, serves the API on it with `serve` in a
+subprocess, then drives each scenario with concurrent HTTP clients and writes the
+latency percentiles and throughput as JSON, e.g.:
+
+    python -m assistant_api.benchmarks.load_test --concurrency 32 --output run.json
+
+Compare two runs by diffing their JSON files.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..hashing import get_password_hash
+
+PACKAGE = __package__.split(".")[0]
+PASSWORD = "benchmark-password"
+START_DATE = date(2023, 1, 1)
+
+
+def seed(url: str, users: int, meals_per_user: int, days: int) -> None:
+    """
+    Creates the users with their settings, meals and one meal plan per day.
+    """
+    seed_engine = create_engine(url)
+    models.Base.metadata.create_all(seed_engine)
+    hashed_password = get_password_hash(PASSWORD)
+    with Session(seed_engine) as db:
+        db.execute(
+            insert(models.User),
+            [
+                {
+                    "id": user_id,
+                    "username": f"user{user_id}",
+                    "email": f"user{user_id}@example.com",
+                    "hashed_password": hashed_password,
+                    "is_active": True,
+                }
+                for user_id in range(1, users + 1)
+            ],
+        )
+        db.execute(
+            insert(models.Settings),
+            [{"id": user_id} for user_id in range(1, users + 1)],
+        )
+        db.execute(
+            insert(models.Meal),
+            [
+                {
+                    "id": (user_id - 1) * meals_per_user + meal,
+                    "name": f"Meal {meal}",
+                    "meal_type": "lunch",
+                    "user_id": user_id,
+                }
+                for user_id in range(1, users + 1)
+                for meal in range(1, meals_per_user + 1)
+            ],
+        )
+        db.execute(
+            insert(models.MealPlan),
+            [
+                {
+                    "user_id": user_id,
+                    "date": START_DATE + timedelta(days=day),
+                    "meal_type": "lunch",
+                    "breakfast_id": (user_id - 1) * meals_per_user
+                    + 1
+                    + day % meals_per_user,
+                    "lunch_id": (user_id - 1) * meals_per_user
+                    + 1
+                    + (day + 1) % meals_per_user,
+                }
+                for user_id in range(1, users + 1)
+                for day in range(days)
+            ],
+        )
+        db.commit()
+    seed_engine.dispose()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(
+    database_url: str, port: int, workers: int, extra_env: dict
+) -> subprocess.Popen:
+    env = (
+        os.environ
+        # Every simulated user logs in from the same address.
+        | {"LOGIN_THROTTLING": "false"}
+        | extra_env
+        | {
+            "DATABASE_URL": database_url,
+            "PYTHONPATH": os.pathsep.join(sys.path),
+        }
+    )
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            f"{PACKAGE}.serve",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        env=env,
+    )
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 30) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("The server did not start")
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, round(fraction * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+async def run_scenario(client, make_request, requests: int, concurrency: int) -> dict:
+    """
+    Sends `requests` requests from `concurrency` concurrent workers.
+
+    Returns:
+        dict: The request and error counts, requests per second and latency
+            percentiles in milliseconds.
+    """
+    latencies: list[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await make_request(client)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+    }
+
+
+def scenarios(users: int, tokens: dict[int, str], days: int) -> dict:
+    def auth(user_id: int) -> dict:
+        return {"Authorization": f"Bearer {tokens[user_id]}"}
+
+    def random_user() -> int:
+        return random.randrange(1, users + 1)
+
+    def login(client):
+        return client.post(
+            "/login", data={"username": f"user{random_user()}", "password": PASSWORD}
+        )
+
+    def users_me(client):
+        return client.get("/users/me", headers=auth(random_user()))
+
+    def settings_read(client):
+        return client.get("/users/me/settings", headers=auth(random_user()))
+
+    def settings_patch(client):
+        return client.patch(
+            "/users/me/settings",
+            headers=auth(random_user()),
+            json=[{"key": "theme_mode", "value": random.choice(["dark", "light"])}],
+        )
+
+    def meal_plans(window: int):
+        def request(client):
+            start = START_DATE + timedelta(days=random.randrange(max(days - window, 1)))
+            end = start + timedelta(days=window - 1)
+            return client.get(
+                "/mealplans/",
+                headers=auth(random_user()),
+                params={
+                    "start_date": f"{start.isoformat()}T00:00:00",
+                    "end_date": f"{end.isoformat()}T00:00:00",
+                },
+            )
+
+        return request
+
+    return {
+        "login_burst": login,
+        "users_me": users_me,
+        "settings_read": settings_read,
+        "settings_patch": settings_patch,
+        "mealplans_week": meal_plans(7),
+        "mealplans_month": meal_plans(31),
+        "mealplans_year": meal_plans(365),
+    }
+
+
+async def benchmark(args, base_url: str) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=60
+    ) as client:
+        await wait_until_ready(client)
+
+        tokens = {}
+        logins = asyncio.Semaphore(8)
+
+        async def log_in(user_id: int) -> None:
+            async with logins:
+                response = await client.post(
+                    "/login", data={"username": f"user{user_id}", "password": PASSWORD}
+                )
+            response.raise_for_status()
+            tokens[user_id] = response.json()["access_token"]
+
+        await asyncio.gather(*(log_in(user_id) for user_id in range(1, args.users + 1)))
+
+        results = {}
+        for name, make_request in scenarios(args.users, tokens, args.days).items():
+            if args.scenarios and name not in args.scenarios:
+                continue
+            requests = args.login_requests if name == "login_burst" else args.requests
+            results[name] = await run_scenario(
+                client, make_request, requests, args.concurrency
+            )
+        return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--meals-per-user", type=int, default=20)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--login-requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=1, help="Server processes.")
+    parser.add_argument(
+        "--scenario",
+        dest="scenarios",
+        action="append",
+        help="Only run this scenario; may be repeated.",
+    )
+    parser.add_argument(
+        "--env",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="Extra environment variable for the server; may be repeated.",
+    )
+    parser.add_argument("--output", type=Path, help="Write the JSON here.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = f"sqlite:///{Path(directory) / 'loadtest.db'}"
+        seed(database_url, args.users, args.meals_per_user, args.days)
+
+        port = free_port()
+        server_env = dict(item.split("=", 1) for item in args.env)
+        server = start_server(database_url, port, args.workers, server_env)
+        try:
+            results = asyncio.run(benchmark(args, f"http://127.0.0.1:{port}"))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "users": args.users,
+            "meals_per_user": args.meals_per_user,
+            "days": args.days,
+            "requests": args.requests,
+            "login_requests": args.login_requests,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "server_env": server_env,
+            "cpu_count": os.cpu_count(),
+        },
+        "scenarios": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
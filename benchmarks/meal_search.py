@@ -0,0 +1,113 @@
+"""
+Measures `crud.search_meals` latency on a large meal table.
+
+Seeds a temporary SQLite database with meals named from a small vocabulary, spread
+over many users, then runs prefix searches for random users and prints the latency
+percentiles, e.g.:
+
+    python -m assistant_api.benchmarks.meal_search --meals 1000000 --users 1000
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from .. import crud, models, schemas
+from .load_test import percentile
+
+WORDS = (
+    "chicken beef pork tofu salmon tuna shrimp lentil chickpea bean rice noodle "
+    "pasta quinoa potato tomato pepper onion garlic ginger curry stew soup salad "
+    "sandwich wrap taco burrito pizza omelette pancake porridge yogurt smoothie "
+    "granola muffin toast bagel roasted grilled fried baked steamed spicy creamy "
+    "sweet sour smoky lemon honey herb mushroom spinach kale broccoli carrot"
+).split()
+MEAL_TYPES = [meal_type.value for meal_type in schemas.MealType]
+
+
+def seed(url: str, meals: int, users: int, batch_size: int = 50000) -> None:
+    seed_engine = create_engine(url)
+    models.Base.metadata.create_all(seed_engine)
+    rng = random.Random(0)
+    with Session(seed_engine) as db:
+        for start in range(0, meals, batch_size):
+            db.execute(
+                insert(models.Meal),
+                [
+                    {
+                        "name": " ".join(rng.sample(WORDS, 3)).capitalize(),
+                        "description": " ".join(rng.sample(WORDS, 8)),
+                        "meal_type": rng.choice(MEAL_TYPES),
+                        "user_id": rng.randrange(1, users + 1),
+                    }
+                    for _ in range(min(batch_size, meals - start))
+                ],
+            )
+        db.commit()
+    seed_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--meals", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--searches", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{Path(directory) / 'search.db'}"
+        start = time.perf_counter()
+        seed(url, args.meals, args.users)
+        seed_seconds = time.perf_counter() - start
+
+        search_engine = create_engine(url)
+        rng = random.Random(1)
+        queries = {
+            "one word prefix": lambda: rng.choice(WORDS)[:3],
+            "two words": lambda: f"{rng.choice(WORDS)} {rng.choice(WORDS)[:4]}",
+            "prefix + meal_type": lambda: rng.choice(WORDS)[:2],
+        }
+        results = {}
+        with Session(search_engine) as db:
+            for name, make_query in queries.items():
+                latencies = []
+                for _ in range(args.searches):
+                    query = make_query()
+                    meal_type = (
+                        rng.choice(list(schemas.MealType))
+                        if name == "prefix + meal_type"
+                        else None
+                    )
+                    start = time.perf_counter()
+                    crud.search_meals(
+                        db, rng.randrange(1, args.users + 1), query, meal_type
+                    )
+                    latencies.append((time.perf_counter() - start) * 1000)
+                latencies.sort()
+                results[name] = {
+                    "p50_ms": round(percentile(latencies, 0.50), 2),
+                    "p95_ms": round(percentile(latencies, 0.95), 2),
+                    "p99_ms": round(percentile(latencies, 0.99), 2),
+                }
+        search_engine.dispose()
+
+    print(
+        json.dumps(
+            {
+                "meals": args.meals,
+                "users": args.users,
+                "seed_seconds": round(seed_seconds, 1),
+                "searches": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
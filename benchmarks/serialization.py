@@ -0,0 +1,102 @@
+"""
+Compares the ways `GET /mealplans/` can serialize a year of meal plans.
+
+Builds 365 meal plans with three meals and two snacks each, then times FastAPI's
+`response_model` path with the stdlib and orjson encoders against
+`serialization.adapter_response`, e.g.:
+
+    python -m assistant_api.benchmarks.serialization --plans 365 --repeat 200
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import date, datetime, timedelta
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from .. import models
+from ..routers.meal_plan import meal_plans_adapter
+from ..schemas import MealPlan
+from ..serialization import adapter_response
+
+
+def make_meal_plans(count: int) -> list[models.MealPlan]:
+    def meal(meal_id: int, meal_type: str) -> models.Meal:
+        return models.Meal(
+            id=meal_id,
+            name=f"Meal {meal_id}",
+            description="A description long enough to be realistic.",
+            meal_type=meal_type,
+            user_id=1,
+        )
+
+    return [
+        models.MealPlan(
+            id=day,
+            date=date(2023, 1, 1) + timedelta(days=day),
+            meal_type="lunch",
+            user_id=1,
+            updated_at=datetime(2023, 1, 1),
+            breakfast=meal(5 * day, "breakfast"),
+            lunch=meal(5 * day + 1, "lunch"),
+            dinner=meal(5 * day + 2, "dinner"),
+            snacks=[meal(5 * day + 3, "snack"), meal(5 * day + 4, "snack")],
+        )
+        for day in range(count)
+    ]
+
+
+def response_model_path(response_class):
+    field = create_response_field("Response_get_meal_plans", list[MealPlan])
+
+    def serialize(meal_plans) -> bytes:
+        content = asyncio.run(
+            serialize_response(
+                field=field, response_content=meal_plans, is_coroutine=True
+            )
+        )
+        return response_class(content).body
+
+    return serialize
+
+
+def adapter_path(meal_plans) -> bytes:
+    return adapter_response(meal_plans_adapter, meal_plans).body
+
+
+PATHS = {
+    "response_model + json": response_model_path(JSONResponse),
+    "response_model + orjson": response_model_path(ORJSONResponse),
+    "TypeAdapter.dump_json": adapter_path,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--plans", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    meal_plans = make_meal_plans(args.plans)
+    bodies = {name: serialize(meal_plans) for name, serialize in PATHS.items()}
+    reference = json.loads(bodies["response_model + json"])
+    assert all(json.loads(body) == reference for body in bodies.values())
+
+    results = {}
+    for name, serialize in PATHS.items():
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            serialize(meal_plans)
+        elapsed = (time.perf_counter() - start) / args.repeat
+        results[name] = {
+            "ms_per_response": round(elapsed * 1000, 3),
+            "bytes": len(bodies[name]),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
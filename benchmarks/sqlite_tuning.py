@@ -0,0 +1,126 @@
+"""
+Compares SQLite throughput with and without the pragmas in `database.SQLITE_PRAGMAS`.
+
+Runs concurrent reader and writer threads against a seeded temporary database for
+each profile and prints the operations per second, e.g.:
+
+    python -m assistant_api.benchmarks.sqlite_tuning --readers 8 --writers 4
+"""
+import argparse
+import json
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import engine_options, set_sqlite_pragmas, SQLITE_PRAGMAS
+
+PROFILES = {"default": {}, "tuned": SQLITE_PRAGMAS}
+
+
+def seed(url: str, users: int) -> None:
+    seed_engine = create_engine(url)
+    models.Base.metadata.create_all(seed_engine)
+    with Session(seed_engine) as db:
+        db.add_all(
+            models.User(
+                username=f"user{i}",
+                email=f"user{i}@example.com",
+                hashed_password="x",
+            )
+            for i in range(users)
+        )
+        db.flush()
+        db.add_all(models.Settings(id=i + 1) for i in range(users))
+        db.commit()
+    seed_engine.dispose()
+
+
+def run_profile(
+    pragmas: dict, readers: int, writers: int, users: int, duration: float
+) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{Path(directory) / 'bench.db'}"
+        seed(url, users)
+        bench_engine = create_engine(
+            url,
+            **engine_options(url) | {"pool_size": readers + writers, "max_overflow": 0},
+        )
+        if pragmas:
+            set_sqlite_pragmas(bench_engine, pragmas)
+
+        counts = {"reads": 0, "writes": 0, "errors": 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def read():
+            done = 0
+            while time.perf_counter() < deadline:
+                with Session(bench_engine) as db:
+                    db.scalars(
+                        select(models.User).where(
+                            models.User.username == f"user{random.randrange(users)}"
+                        )
+                    ).first()
+                done += 1
+            with lock:
+                counts["reads"] += done
+
+        def write():
+            done = errors = 0
+            while time.perf_counter() < deadline:
+                try:
+                    with Session(bench_engine) as db:
+                        db.execute(
+                            update(models.Settings)
+                            .where(models.Settings.id == random.randrange(users) + 1)
+                            .values(theme_mode=random.choice(["dark", "light"]))
+                        )
+                        db.commit()
+                    done += 1
+                except OperationalError:
+                    errors += 1
+            with lock:
+                counts["writes"] += done
+                counts["errors"] += errors
+
+        threads = [threading.Thread(target=read) for _ in range(readers)]
+        threads += [threading.Thread(target=write) for _ in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        bench_engine.dispose()
+
+    return {
+        "reads_per_second": round(counts["reads"] / duration),
+        "writes_per_second": round(counts["writes"] / duration),
+        "write_errors": counts["errors"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    results = {
+        name: run_profile(
+            pragmas, args.readers, args.writers, args.users, args.duration
+        )
+        for name, pragmas in PROFILES.items()
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Cold start time of a worker process.
+
+Starts fresh interpreters that import the application, create it, run its startup
+against an existing database and serve one request, and prints the median time of
+each step as JSON, e.g.:
+
+    python -m assistant_api.benchmarks.startup --runs 10
+
+Pass `--importtime` to also list the slowest modules to import.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+from .. import models
+
+PACKAGE = __package__.split(".")[0]
+
+# Run in the child interpreter; prints the seconds each step took.
+PROBE = f"""
+import asyncio, json, time
+import httpx
+start = time.perf_counter()
+from {PACKAGE}.main import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+
+async def serve():
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            (await client.get("/")).raise_for_status()
+        return started, time.perf_counter()
+
+started, responded = asyncio.run(serve())
+print(json.dumps({{
+    "import": imported - start,
+    "create_app": created - imported,
+    "startup": started - created,
+    "first_request": responded - started,
+}}))
+"""
+
+
+def run_probe(env: dict) -> dict[str, float]:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], env=env, capture_output=True, text=True
+    )
+    if output.returncode != 0:
+        raise RuntimeError(output.stderr)
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+def slowest_imports(env: dict, count: int) -> list[tuple[str, float]]:
+    """
+    Returns the modules with the largest cumulative import time, in milliseconds.
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {PACKAGE}.main"],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    modules = []
+    for line in output.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        modules.append((name.strip(), int(cumulative) / 1000))
+    modules.sort(key=lambda module: module[1], reverse=True)
+    return modules[:count]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--env",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="Extra environment variable for the app; may be repeated.",
+    )
+    parser.add_argument("--importtime", type=int, default=0, metavar="COUNT")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = f"sqlite:///{Path(directory) / 'startup.db'}"
+        # The schema exists, as it would after migrating.
+        models.Base.metadata.create_all(create_engine(database_url))
+        env = (
+            os.environ
+            | {
+                "DATABASE_URL": database_url,
+                "PYTHONPATH": os.pathsep.join(sys.path),
+            }
+            | dict(item.split("=", 1) for item in args.env)
+        )
+        runs = [run_probe(env) for _ in range(args.runs)]
+        report = {
+            "runs": args.runs,
+            "median_ms": {
+                step: round(statistics.median(run[step] for run in runs) * 1000, 1)
+                for step in runs[0]
+            },
+        }
+        report["median_ms"]["total"] = round(sum(report["median_ms"].values()), 1)
+        if args.importtime:
+            report["slowest_imports_ms"] = dict(slowest_imports(env, args.importtime))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+Caching primitives.
+
+`TTLCache` keeps entries in the process; `SQLiteCache` keeps them in a SQLite file
+that every worker process on the host shares. Both implement `CacheBackend`, and
+`make_cache` picks one from configuration. From async code, go through
+`call_cache`, which keeps the file I/O of `SQLiteCache` off the event loop.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Protocol
+
+from starlette.concurrency import run_in_threadpool
+
+
+class CacheBackend(Protocol):
+    """
+    The interface of the cache backends.
+
+    `blocking` tells whether the operations do I/O that may wait, e.g. on a lock
+    held by another process.
+    """
+
+    blocking: bool
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        ...
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        ...
+
+    def set(self, key: Hashable, value: Any) -> None:
+        ...
+
+    def delete(self, key: Hashable) -> None:
+        ...
+
+    def clear(self) -> None:
+        ...
+
+    def stats(self) -> dict[str, int | float]:
+        ...
+
+
+class TTLCache:
+    """
+    A thread-safe, bounded LRU cache whose entries expire after a fixed time.
+
+    Args:
+        maxsize (int): The maximum number of entries. The least recently used entry
+            is evicted when the cache is full.
+        ttl (float): The number of seconds an entry stays valid.
+        timer (Callable[[], float], optional): The clock used for expiry.
+            Defaults to `time.monotonic`.
+    """
+
+    blocking = False
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns the cached value for the key, or default if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires, value = entry
+            if expires <= self.timer():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Like `get`, but without counting a hit or miss or refreshing the entry's
+        recency.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None or entry[0] <= self.timer():
+            return default
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Caches the value for the key, evicting the least recently used entry if full.
+        """
+        with self._lock:
+            self._data[key] = (self.timer() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        """
+        Removes the key from the cache, if present.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Removes every entry from the cache.
+        """
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        Returns the cache's hit and miss counters.
+
+        Returns:
+            dict: The hits, misses, hit rate, evictions, current size and maximum size.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
+
+
+_MISSING = object()
+
+
+class SQLiteCache:
+    """
+    A bounded cache with expiring entries, stored in a SQLite file so that the
+    worker processes of a deployment share it.
+
+    Values are stored as JSON, so they must be JSON-serializable and come back as
+    the equivalent JSON types. Expired and surplus entries are purged every
+    `purge_every` writes, so the size may briefly exceed `maxsize`. Hit and miss
+    counters are per process.
+
+    Args:
+        path (str): The SQLite database file; created if missing.
+        maxsize (int): The maximum number of entries. The entries closest to expiry
+            are evicted first.
+        ttl (float): The number of seconds an entry stays valid.
+        timer (Callable[[], float], optional): The clock used for expiry, which must
+            agree across processes. Defaults to `time.time`.
+        purge_every (int, optional): The number of writes between purges.
+            Defaults to 64.
+    """
+
+    blocking = True
+
+    def __init__(
+        self,
+        path: str,
+        maxsize: int,
+        ttl: float,
+        timer: Callable[[], float] = time.time,
+        purge_every: int = 64,
+    ):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._connection().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_cache_expires ON cache (expires);
+            """
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads; keep one per thread.
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # Losing the cache in a power failure is harmless.
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute("PRAGMA busy_timeout=5000")
+            self._local.connection = connection
+        return connection
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns the cached value for the key, or default if it is missing or expired.
+        """
+        value = self.peek(key, _MISSING)
+        self._count(value is not _MISSING)
+        return default if value is _MISSING else value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Like `get`, but without counting a hit or miss.
+        """
+        row = (
+            self._connection()
+            .execute(
+                "SELECT value FROM cache WHERE key = ? AND expires > ?",
+                (str(key), self.timer()),
+            )
+            .fetchone()
+        )
+        return default if row is None else json.loads(row[0])
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Caches the value for the key.
+        """
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+            (str(key), json.dumps(value), self.timer() + self.ttl),
+        )
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % self.purge_every == 0
+        if purge:
+            self._purge(connection)
+
+    def _purge(self, connection: sqlite3.Connection) -> None:
+        connection.execute("DELETE FROM cache WHERE expires <= ?", (self.timer(),))
+        evicted = connection.execute(
+            """
+            DELETE FROM cache WHERE key IN (
+                SELECT key FROM cache ORDER BY expires
+                LIMIT max((SELECT count(*) FROM cache) - ?, 0)
+            )
+            """,
+            (self.maxsize,),
+        ).rowcount
+        with self._lock:
+            self.evictions += evicted
+
+    def delete(self, key: Hashable) -> None:
+        """
+        Removes the key from the cache, if present.
+        """
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (str(key),))
+
+    def clear(self) -> None:
+        """
+        Removes every entry from the cache.
+        """
+        self._connection().execute("DELETE FROM cache")
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT count(*) FROM cache").fetchone()[0]
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        Returns the cache's hit and miss counters.
+
+        Returns:
+            dict: The hits, misses, hit rate, evictions, current size and maximum size.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": len(self),
+            "maxsize": self.maxsize,
+        }
+
+
+async def call_cache(cache: CacheBackend, fn: Callable, /, *args, **kwargs) -> Any:
+    """
+    Calls a function using the cache from async code: in the threadpool if the
+    cache is blocking, else directly, which is cheaper than a thread hop.
+
+    Args:
+        cache (CacheBackend): The cache the function uses.
+        fn (Callable): The function, e.g. one of the cache's methods.
+
+    Returns:
+        Any: The return value of the function.
+    """
+    if cache.blocking:
+        return await run_in_threadpool(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+def make_cache(backend: str, maxsize: int, ttl: float, path: str) -> CacheBackend:
+    """
+    Returns a cache using the named backend.
+
+    Args:
+        backend (str): "memory" for a per-process `TTLCache`, or "sqlite" for a
+            `SQLiteCache` shared by the processes using the same file.
+        maxsize (int): The maximum number of entries.
+        ttl (float): The number of seconds an entry stays valid.
+        path (str): The file of the "sqlite" backend.
+
+    Returns:
+        CacheBackend: The cache.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    if backend == "memory":
+        return TTLCache(maxsize=maxsize, ttl=ttl)
+    if backend == "sqlite":
+        return SQLiteCache(path, maxsize=maxsize, ttl=ttl)
+    raise ValueError(f"Unknown cache backend {backend!r}; use 'memory' or 'sqlite'")
@@ -0,0 +1,90 @@
+"""
+Picks the bcrypt cost for this host.
+
+Times bcrypt verifies at increasing costs and reports the highest one whose median
+verify time stays within the target, as the `BCRYPT_ROUNDS` setting, e.g.:
+
+    python -m assistant_api.calibrate --target-ms 250
+
+Run it on the production hardware: each increment doubles the time, and a login
+occupies a core for that long, so the target trades login throughput (about
+1000 / target logins per second per core) against the cost of cracking a leaked
+hash. Hashes made with the previous cost are upgraded at each user's next login.
+"""
+import argparse
+import statistics
+import time
+
+from passlib.hash import bcrypt
+
+MIN_ROUNDS = 4
+MAX_ROUNDS = 20
+
+
+def verify_time(rounds: int, samples: int) -> float:
+    """
+    Returns the median time to verify a password against a hash of the cost.
+
+    Args:
+        rounds (int): The bcrypt cost.
+        samples (int): The number of verifies to time.
+
+    Returns:
+        float: The median verify time, in seconds.
+    """
+    hashed = bcrypt.using(rounds=rounds).hash("calibration password")
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        bcrypt.verify("calibration password", hashed)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def calibrate(target: float, samples: int = 5) -> tuple[int, dict[int, float]]:
+    """
+    Returns the highest bcrypt cost whose verify time is within the target.
+
+    Costs are tried from `MIN_ROUNDS` up, stopping at the first one over the target,
+    so calibration takes about twice the target per sample.
+
+    Args:
+        target (float): The maximum verify time, in seconds.
+        samples (int, optional): The verifies timed per cost. Defaults to 5.
+
+    Returns:
+        tuple[int, dict[int, float]]: The cost, and the median verify time of each
+            cost tried.
+    """
+    timings: dict[int, float] = {}
+    chosen = MIN_ROUNDS
+    for rounds in range(MIN_ROUNDS, MAX_ROUNDS + 1):
+        timings[rounds] = verify_time(rounds, samples)
+        if timings[rounds] > target:
+            break
+        chosen = rounds
+    return chosen, timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--target-ms",
+        type=float,
+        default=250,
+        help="The longest acceptable verify time, in milliseconds.",
+    )
+    parser.add_argument("--samples", type=int, default=5)
+    args = parser.parse_args()
+
+    rounds, timings = calibrate(args.target_ms / 1000, args.samples)
+    for tried, seconds in timings.items():
+        marker = "  <-" if tried == rounds else ""
+        print(f"rounds={tried:2d}  {seconds * 1000:9.1f} ms{marker}")
+    if timings[rounds] > args.target_ms / 1000:
+        print(f"Even the minimum cost takes longer than {args.target_ms:g} ms.")
+    print(f"BCRYPT_ROUNDS={rounds}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,33 @@
-from .settings import create_user_settings, get_user_settings, set_user_setting
+from .settings import (
+    create_user_settings,
+    get_user_settings,
+    get_user_settings_version,
+    set_user_setting,
+    set_user_settings,
+)
 from .users import (
+    DuplicateUserError,
     create_user,
     get_user,
     get_user_by_email,
     get_users,
+    get_user_count_estimate,
     get_user_by_username,
+    update_user_password_hash,
+)
+from .meal_plan import (
+    count_summary_periods,
+    create_meals,
+    get_meal_plan_summaries,
+    get_meal_plans,
+    get_meal_plans_version,
+    refresh_meal_plan_week_summaries,
+    search_meals,
+    upsert_meal_plans,
+)
+from .revoked_tokens import (
+    delete_expired_revoked_tokens,
+    get_revoked_tokens,
+    revoke_token,
 )
-from .meal_plan import get_meal_plans
+from . import aio
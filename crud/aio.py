@@ -0,0 +1,234 @@
+"""
+Async versions of the crud functions, for use from `async def` routes.
+
+Each function has the same signature as its sync counterpart and runs it through
+`database.run_sync`, so the query code lives in one place and works with both the
+`AsyncSession` and the sync `Session` configurations. The exception is
+`iter_meal_plans`, which streams and so cannot run as a single call.
+
+The settings functions also read and update `settings_cache` around the call,
+through `cache.call_cache`, so that a SQLite cache never blocks the event loop.
+"""
+from datetime import date, datetime
+from typing import AsyncIterator
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import iterate_in_threadpool
+
+from .. import models, schemas
+from ..cache import call_cache
+from ..database import DBSession, run_sync
+from . import meal_plan, revoked_tokens, users
+from . import settings as user_settings
+
+
+async def get_user(db: DBSession, user_id: int):
+    return await run_sync(db, users.get_user, user_id=user_id)
+
+
+async def get_user_by_email(db: DBSession, email: str):
+    return await run_sync(db, users.get_user_by_email, email=email)
+
+
+async def get_user_by_username(db: DBSession, username: str):
+    return await run_sync(db, users.get_user_by_username, username=username)
+
+
+async def get_users(
+    db: DBSession,
+    after_id: int | None = None,
+    limit: int = 100,
+    is_active: bool | None = None,
+    username_prefix: str | None = None,
+):
+    return await run_sync(
+        db,
+        users.get_users,
+        after_id=after_id,
+        limit=limit,
+        is_active=is_active,
+        username_prefix=username_prefix,
+    )
+
+
+async def update_user_password_hash(db: DBSession, user_id: int, hashed_password: str):
+    return await run_sync(
+        db,
+        users.update_user_password_hash,
+        user_id=user_id,
+        hashed_password=hashed_password,
+    )
+
+
+async def get_user_count_estimate(db: DBSession):
+    return await run_sync(db, users.get_user_count_estimate)
+
+
+async def create_user(db: DBSession, user: schemas.UserCreate):
+    db_user = await run_sync(db, users.create_user, user=user)
+    await _settings_cache(
+        user_settings.cache_user_settings, db_user.settings[0], replace=True
+    )
+    return db_user
+
+
+async def _settings_cache(fn, /, *args, **kwargs):
+    return await call_cache(user_settings.settings_cache, fn, *args, **kwargs)
+
+
+async def get_user_settings(user_id: int, db: DBSession):
+    # Cache hits don't need the session, so skip the dispatch to a worker.
+    cached = await _settings_cache(user_settings.cached_user_settings, user_id)
+    if cached is not None:
+        return cached
+    db_settings = await run_sync(db, user_settings.get_user_settings, user_id)
+    await _settings_cache(user_settings.cache_user_settings, db_settings)
+    return db_settings
+
+
+async def get_user_settings_version(user_id: int, db: DBSession):
+    cached = await _settings_cache(user_settings.cached_user_settings, user_id)
+    if cached is not None:
+        return cached.version
+    return await run_sync(db, user_settings.get_user_settings_version, user_id)
+
+
+async def set_user_setting(user_id: int, setting: schemas.Setting, db: DBSession):
+    if await set_user_settings(user_id, [setting], db) is None:
+        return None
+    return setting
+
+
+async def set_user_settings(
+    user_id: int, settings: list[schemas.Setting], db: DBSession
+):
+    db_settings = await run_sync(
+        db, user_settings.update_user_settings, user_id, settings
+    )
+    if db_settings is not None:
+        # Dropped rather than replaced: concurrent writes may get here out of order.
+        await _settings_cache(user_settings.settings_cache.delete, user_id)
+    return db_settings
+
+
+async def create_user_settings(db: DBSession, user_id: int):
+    db_settings = await run_sync(
+        db, user_settings.create_user_settings, user_id=user_id
+    )
+    await _settings_cache(user_settings.cache_user_settings, db_settings, replace=True)
+    return db_settings
+
+
+async def get_meal_plans(
+    db: DBSession,
+    user_id: int,
+    start_date: date,
+    end_date: date,
+):
+    return await run_sync(
+        db,
+        meal_plan.get_meal_plans,
+        user_id=user_id,
+        start_date=start_date,
+        end_date=end_date,
+    )
+
+
+async def get_meal_plans_version(
+    db: DBSession,
+    user_id: int,
+    start_date: date,
+    end_date: date,
+):
+    return await run_sync(
+        db,
+        meal_plan.get_meal_plans_version,
+        user_id=user_id,
+        start_date=start_date,
+        end_date=end_date,
+    )
+
+
+async def get_meal_plan_summaries(
+    db: DBSession,
+    user_id: int,
+    start_date: date,
+    end_date: date,
+    period: schemas.SummaryPeriod = schemas.SummaryPeriod.WEEK,
+):
+    return await run_sync(
+        db,
+        meal_plan.get_meal_plan_summaries,
+        user_id=user_id,
+        start_date=start_date,
+        end_date=end_date,
+        period=period,
+    )
+
+
+async def create_meals(db: DBSession, user_id: int, meals: list[schemas.MealCreate]):
+    return await run_sync(db, meal_plan.create_meals, user_id=user_id, meals=meals)
+
+
+async def upsert_meal_plans(
+    db: DBSession, user_id: int, plans: list[schemas.MealPlanImport]
+):
+    return await run_sync(db, meal_plan.upsert_meal_plans, user_id=user_id, plans=plans)
+
+
+async def search_meals(
+    db: DBSession,
+    user_id: int,
+    query: str,
+    meal_type: schemas.MealType | None = None,
+    limit: int = 20,
+):
+    return await run_sync(
+        db,
+        meal_plan.search_meals,
+        user_id=user_id,
+        query=query,
+        meal_type=meal_type,
+        limit=limit,
+    )
+
+
+async def revoke_token(db: DBSession, jti: str, expires_at: datetime):
+    return await run_sync(
+        db, revoked_tokens.revoke_token, jti=jti, expires_at=expires_at
+    )
+
+
+async def get_revoked_tokens(db: DBSession, after_id: int = 0):
+    return await run_sync(db, revoked_tokens.get_revoked_tokens, after_id=after_id)
+
+
+async def delete_expired_revoked_tokens(db: DBSession):
+    return await run_sync(db, revoked_tokens.delete_expired_revoked_tokens)
+
+
+async def iter_meal_plans(
+    db: DBSession,
+    user_id: int,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    batch_size: int = 500,
+) -> AsyncIterator[list[models.MealPlan]]:
+    # Generators can't cross `run_sync`: stream the rows on the async driver, or
+    # step the sync generator in the threadpool.
+    if isinstance(db, AsyncSession):
+        query = meal_plan.meal_plans_query(user_id, start_date, end_date)
+        result = await db.stream_scalars(query.execution_options(yield_per=batch_size))
+        async for partition in result.partitions():
+            yield partition
+        return
+
+    batches = meal_plan.iter_meal_plans(
+        db,
+        user_id=user_id,
+        start_date=start_date,
+        end_date=end_date,
+        batch_size=batch_size,
+    )
+    async for batch in iterate_in_threadpool(batches):
+        yield batch
@@ -1,21 +1,677 @@
-from datetime import datetime
-from sqlalchemy.orm import Session
+import re
+from datetime import date, datetime, timedelta
+from typing import Iterator, Sequence
+from sqlalchemy import (
+    Date,
+    Select,
+    case,
+    cast,
+    column,
+    delete,
+    distinct,
+    func,
+    insert,
+    literal_column,
+    select,
+    table,
+    text,
+    union_all,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, joinedload, selectinload
 from .. import schemas
 from .. import models
 
+# Loads every meal slot with the plans: one joined query for the single meals and
+# one IN query for all the plans' snacks, however many plans are returned.
+MEAL_PLAN_LOAD_OPTIONS = (
+    joinedload(models.MealPlan.breakfast),
+    joinedload(models.MealPlan.lunch),
+    joinedload(models.MealPlan.dinner),
+    selectinload(models.MealPlan.snacks),
+)
+
+
+# The INSERT constructs supporting ON CONFLICT, by dialect.
+UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+# Keeps IN lists well below SQLite's bound parameter limit.
+IN_CHUNK_SIZE = 1000
+
+SEARCH_TERM = re.compile(r"\w+")
+# The longest prefix in the FTS5 prefix indexes; longer terms are truncated to it.
+SEARCH_PREFIX_LENGTH = 7
+
+# The FTS5 index of the meals on SQLite; see `models.meal_plan.MEALS_FTS_DDL`.
+meals_fts = table("meals_fts", column("rowid"), column("meals_fts"))
+
+# The totals of a meal plan summary, as computed by `meal_plan_summary_query` and
+# stored in `models.MealPlanWeekSummary`.
+SUMMARY_COLUMNS = (
+    "days_planned",
+    "breakfasts",
+    "lunches",
+    "dinners",
+    "snacks",
+    "distinct_meals",
+)
+
+
+def _chunks(values: Sequence, size: int = IN_CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
 
 def get_meal_plans(
     db: Session,
     user_id: int,
-    start_date: datetime,
-    end_date: datetime,
+    start_date: date,
+    end_date: date,
 ):
-    return (
-        db.query(models.MealPlan)
-        .filter(
+    return db.scalars(meal_plans_query(user_id, start_date, end_date)).all()
+
+
+def meal_plans_query(
+    user_id: int,
+    start_date: date | None = None,
+    end_date: date | None = None,
+) -> Select:
+    """
+    Returns the query of the user's meal plans in the date range, by date, with
+    their meals.
+
+    Args:
+        user_id (int): The ID of the user.
+        start_date (date | None, optional): The first day of the range. Defaults to
+            the user's first plan.
+        end_date (date | None, optional): The last day of the range. Defaults to
+            the user's last plan.
+
+    Returns:
+        Select: The query.
+    """
+    query = (
+        select(models.MealPlan)
+        .options(*MEAL_PLAN_LOAD_OPTIONS)
+        .where(models.MealPlan.user_id == user_id)
+        .order_by(models.MealPlan.date, models.MealPlan.id)
+    )
+    if start_date is not None:
+        query = query.where(models.MealPlan.date >= start_date)
+    if end_date is not None:
+        query = query.where(models.MealPlan.date <= end_date)
+    return query
+
+
+def iter_meal_plans(
+    db: Session,
+    user_id: int,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    batch_size: int = 500,
+) -> Iterator[list[models.MealPlan]]:
+    """
+    Yields the user's meal plans in batches, fetched with a server-side cursor, so
+    memory use doesn't grow with the range.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The ID of the user.
+        start_date (date | None, optional): The first day of the range.
+        end_date (date | None, optional): The last day of the range.
+        batch_size (int, optional): The number of plans per batch. Defaults to 500.
+
+    Yields:
+        list[MealPlan]: The next batch of meal plans, with their meals.
+    """
+    result = db.scalars(
+        meal_plans_query(user_id, start_date, end_date).execution_options(
+            yield_per=batch_size
+        )
+    )
+    yield from result.partitions()
+
+
+def get_meal_plans_version(
+    db: Session,
+    user_id: int,
+    start_date: date,
+    end_date: date,
+) -> tuple[int, datetime | None]:
+    """
+    Returns what the user's meal plans in the date range depend on, without
+    loading them: the number of plans and their latest `updated_at`.
+
+    Adding or updating a plan raises the latest `updated_at` and deleting one lowers
+    the count, so either changes the pair.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The ID of the user.
+        start_date (date): The first day of the range.
+        end_date (date): The last day of the range.
+
+    Returns:
+        tuple[int, datetime | None]: The count and the latest `updated_at`.
+    """
+    count, updated_at = db.execute(
+        select(
+            func.count(models.MealPlan.id), func.max(models.MealPlan.updated_at)
+        ).where(
             models.MealPlan.user_id == user_id,
             models.MealPlan.date >= start_date,
             models.MealPlan.date <= end_date,
         )
-        .all()
+    ).one()
+    return count, updated_at
+
+
+def period_start(day: date, period: schemas.SummaryPeriod) -> date:
+    """
+    Returns the first day of the week, starting on Monday, or month of the day.
+    """
+    if period is schemas.SummaryPeriod.WEEK:
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def next_period_start(start: date, period: schemas.SummaryPeriod) -> date:
+    """
+    Returns the first day of the period after the one starting on `start`.
+    """
+    if period is schemas.SummaryPeriod.WEEK:
+        return start + timedelta(days=7)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def count_summary_periods(
+    start_date: date, end_date: date, period: schemas.SummaryPeriod
+) -> int:
+    """
+    Returns the number of periods `get_meal_plan_summaries` returns for the range.
+
+    Args:
+        start_date (date): The first day of the range.
+        end_date (date): The last day of the range.
+        period (SummaryPeriod): The periods to total over.
+
+    Returns:
+        int: The number of periods, 0 if the range is empty.
+
+    Raises:
+        OverflowError: If the period after the last would start past `date.max`.
+    """
+    first, last = period_start(start_date, period), period_start(end_date, period)
+    # `get_meal_plan_summaries` bounds the last period by the start of the next.
+    if period is schemas.SummaryPeriod.WEEK:
+        unbounded = (date.max - last).days < 7
+    else:
+        unbounded = (last.year, last.month) == (date.max.year, date.max.month)
+    if unbounded:
+        raise OverflowError("The last period ends at date.max")
+    if first > last:
+        return 0
+    if period is schemas.SummaryPeriod.WEEK:
+        return (last - first).days // 7 + 1
+    return (last.year - first.year) * 12 + last.month - first.month + 1
+
+
+def _period_start_column(dialect: str, period: schemas.SummaryPeriod, day):
+    # The SQL equivalent of `period_start`.
+    if dialect == "postgresql":
+        return cast(func.date_trunc(period.value, day), Date)
+    if period is schemas.SummaryPeriod.WEEK:
+        # The next Sunday, or the day itself, then back to its Monday.
+        return func.date(day, "weekday 0", "-6 days", type_=Date)
+    return func.date(day, "start of month", type_=Date)
+
+
+def meal_plan_summary_query(
+    dialect: str,
+    period: schemas.SummaryPeriod,
+    user_id: int,
+    start_date: date,
+    end_date: date,
+) -> Select:
+    """
+    Returns the query totalling the user's meal plans in the date range per period,
+    with a GROUP BY.
+
+    Every slot of every plan becomes one row of a UNION ALL, plus one row per plan
+    for the planned days; each branch reads its range of the (user_id, date) index.
+    Periods without plans are left out.
+
+    Args:
+        dialect (str): The database's dialect name.
+        period (SummaryPeriod): The periods to total over.
+        user_id (int): The ID of the user.
+        start_date (date): The first day of the range.
+        end_date (date): The last day of the range.
+
+    Returns:
+        Select: The query, selecting user_id, period_start and `SUMMARY_COLUMNS`.
+    """
+    plan = models.MealPlan
+    snacks = models.mealplan_snacks
+    in_range = (
+        plan.user_id == user_id,
+        plan.date >= start_date,
+        plan.date <= end_date,
+    )
+    start = _period_start_column(dialect, period, plan.date).label("period_start")
+
+    def slot(name: str, meal_id):
+        return select(
+            plan.user_id,
+            start,
+            literal_column(f"'{name}'").label("slot"),
+            meal_id.label("meal_id"),
+        )
+
+    slots = union_all(
+        slot("day", literal_column("NULL")).where(*in_range),
+        slot("breakfast", plan.breakfast_id).where(
+            *in_range, plan.breakfast_id.is_not(None)
+        ),
+        slot("lunch", plan.lunch_id).where(*in_range, plan.lunch_id.is_not(None)),
+        slot("dinner", plan.dinner_id).where(*in_range, plan.dinner_id.is_not(None)),
+        slot("snack", snacks.c.meal_id)
+        .join_from(plan, snacks, snacks.c.mealplan_id == plan.id)
+        .where(*in_range),
+    ).subquery()
+
+    def count(name: str):
+        return func.count(case((slots.c.slot == name, 1)))
+
+    return select(
+        slots.c.user_id,
+        slots.c.period_start,
+        count("day").label("days_planned"),
+        count("breakfast").label("breakfasts"),
+        count("lunch").label("lunches"),
+        count("dinner").label("dinners"),
+        count("snack").label("snacks"),
+        func.count(distinct(slots.c.meal_id)).label("distinct_meals"),
+    ).group_by(slots.c.user_id, slots.c.period_start)
+
+
+def refresh_meal_plan_week_summaries(
+    db: Session, user_id: int, start_date: date, end_date: date
+) -> None:
+    """
+    Recomputes the user's week summaries of the weeks from the one containing
+    `start_date` to the one containing `end_date`, without committing.
+
+    Called in the transaction of every meal plan write, so that the summaries
+    change with the plans. The weeks are upserted, so that concurrent refreshes
+    of the same week don't collide on its primary key, and weeks left without
+    plans are deleted.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The ID of the user.
+        start_date (date): A day of the first week.
+        end_date (date): A day of the last week.
+    """
+    week = schemas.SummaryPeriod.WEEK
+    first, last = period_start(start_date, week), period_start(end_date, week)
+    dialect = db.get_bind().dialect.name
+    # Serializes the refreshes of the user's summaries on PostgreSQL, so that each
+    # reads the plans committed by the previous one instead of overwriting its
+    # totals with a snapshot that lacks them. SQLite serializes writers anyway.
+    db.execute(
+        select(models.User.id).where(models.User.id == user_id).with_for_update()
+    )
+
+    table = models.MealPlanWeekSummary.__table__
+    statement = UPSERT_INSERTS[dialect](table).from_select(
+        ["user_id", "week_start", *SUMMARY_COLUMNS],
+        meal_plan_summary_query(
+            dialect,
+            week,
+            user_id,
+            first,
+            next_period_start(last, week) - timedelta(days=1),
+        ),
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.week_start],
+        set_={column: statement.excluded[column] for column in SUMMARY_COLUMNS},
+    ).returning(table.c.week_start)
+    weeks = list(db.scalars(statement))
+
+    # The weeks left without plans.
+    db.execute(
+        delete(table).where(
+            table.c.user_id == user_id,
+            table.c.week_start >= first,
+            table.c.week_start <= last,
+            table.c.week_start.not_in(weeks),
+        )
+    )
+
+
+def get_meal_plan_summaries(
+    db: Session,
+    user_id: int,
+    start_date: date,
+    end_date: date,
+    period: schemas.SummaryPeriod = schemas.SummaryPeriod.WEEK,
+) -> list[schemas.MealPlanSummary]:
+    """
+    Returns the totals of the user's meal plans for every week or month overlapping
+    the date range, including those without plans.
+
+    Periods are whole: the range is widened to the start of its first period and
+    the end of its last. Weeks are read from `models.MealPlanWeekSummary`, a row
+    each; months are totalled from the plans by `meal_plan_summary_query`.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The ID of the user.
+        start_date (date): The first day of the range.
+        end_date (date): The last day of the range.
+        period (SummaryPeriod, optional): The periods to total over. Defaults to
+            weeks.
+
+    Returns:
+        list[MealPlanSummary]: The summary of each period, in order.
+    """
+    first = period_start(start_date, period)
+    last = period_start(end_date, period)
+    if period is schemas.SummaryPeriod.WEEK:
+        summary = models.MealPlanWeekSummary
+        statement = select(
+            summary.week_start.label("period_start"),
+            *(getattr(summary, name) for name in SUMMARY_COLUMNS),
+        ).where(
+            summary.user_id == user_id,
+            summary.week_start >= first,
+            summary.week_start <= last,
+        )
+    else:
+        statement = meal_plan_summary_query(
+            db.get_bind().dialect.name,
+            period,
+            user_id,
+            first,
+            next_period_start(last, period) - timedelta(days=1),
+        )
+    totals = {row.period_start: row for row in db.execute(statement)}
+
+    summaries = []
+    start = first
+    while start <= last:
+        end = next_period_start(start, period)
+        row = totals.get(start)
+        values = {name: getattr(row, name) if row else 0 for name in SUMMARY_COLUMNS}
+        summaries.append(
+            schemas.MealPlanSummary(
+                start_date=start,
+                end_date=end - timedelta(days=1),
+                gaps=(end - start).days - values["days_planned"],
+                **values,
+            )
+        )
+        start = end
+    return summaries
+
+
+def create_meals(
+    db: Session, user_id: int, meals: list[schemas.MealCreate]
+) -> schemas.BulkResult:
+    """
+    Creates the meals with batched multi-row INSERTs, in one transaction.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The ID of the user owning the meals.
+        meals (list[MealCreate]): The meals to create.
+
+    Returns:
+        BulkResult: The ID of each created meal, in the order given.
+    """
+    ids = []
+    if meals:
+        ids = db.scalars(
+            insert(models.Meal).returning(models.Meal.id, sort_by_parameter_order=True),
+            [
+                {
+                    "name": meal.name,
+                    "description": meal.description,
+                    "meal_type": meal.meal_type.value,
+                    "user_id": user_id,
+                }
+                for meal in meals
+            ],
+        ).all()
+        db.commit()
+    return schemas.BulkResult(
+        created=len(ids),
+        updated=0,
+        rejected=0,
+        items=[
+            schemas.BulkItemResult(
+                index=index, status=schemas.BulkItemStatus.CREATED, id=meal_id
+            )
+            for index, meal_id in enumerate(ids)
+        ],
+    )
+
+
+def upsert_meal_plans(
+    db: Session, user_id: int, plans: list[schemas.MealPlanImport]
+) -> schemas.BulkResult:
+    """
+    Creates or replaces the user's meal plans, one per date, with batched
+    multi-row INSERT ... ON CONFLICT statements in one transaction.
+
+    A plan replaces the user's existing plan for the same date, snacks included.
+    Plans referring to meals the user doesn't own are rejected, and so are valid
+    plans followed by another valid plan for the same date in the request; the
+    others are still written.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The ID of the user owning the plans.
+        plans (list[MealPlanImport]): The plans to write.
+
+    Returns:
+        BulkResult: The outcome and plan ID of each item, in the order given.
+    """
+    items: list[schemas.BulkItemResult | None] = [None] * len(plans)
+
+    owned_meals = set(
+        db.scalars(select(models.Meal.id).where(models.Meal.user_id == user_id))
+    )
+    valid: list[int] = []
+    for index, plan in enumerate(plans):
+        unknown = sorted(
+            meal_id
+            for meal_id in (
+                plan.breakfast_id,
+                plan.lunch_id,
+                plan.dinner_id,
+                *plan.snack_ids,
+            )
+            if meal_id is not None and meal_id not in owned_meals
+        )
+        if unknown:
+            items[index] = schemas.BulkItemResult(
+                index=index,
+                status=schemas.BulkItemStatus.REJECTED,
+                detail=f"Unknown meals {unknown}",
+            )
+        else:
+            valid.append(index)
+
+    # Only a valid plan supersedes: a rejected one doesn't leave its date unplanned.
+    last_index = {plans[index].date: index for index in valid}
+    accepted: list[int] = []
+    for index in valid:
+        if last_index[plans[index].date] == index:
+            accepted.append(index)
+        else:
+            items[index] = schemas.BulkItemResult(
+                index=index,
+                status=schemas.BulkItemStatus.REJECTED,
+                detail="Superseded by a later plan for the same date",
+            )
+
+    if accepted:
+        dates = [plans[index].date for index in accepted]
+        existing = set(
+            db.scalars(
+                select(models.MealPlan.date).where(
+                    models.MealPlan.user_id == user_id,
+                    models.MealPlan.date >= min(dates),
+                    models.MealPlan.date <= max(dates),
+                )
+            )
+        )
+
+        now = datetime.utcnow()
+        table = models.MealPlan.__table__
+        statement = UPSERT_INSERTS[db.get_bind().dialect.name](table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.date],
+            set_={
+                column: statement.excluded[column]
+                for column in (
+                    "meal_type",
+                    "breakfast_id",
+                    "lunch_id",
+                    "dinner_id",
+                    "updated_at",
+                )
+            },
+        ).returning(table.c.id, table.c.date)
+        plan_ids = {
+            plan_date: plan_id
+            for plan_id, plan_date in db.execute(
+                statement,
+                [
+                    {
+                        "user_id": user_id,
+                        "date": plans[index].date,
+                        "meal_type": plans[index].meal_type.value,
+                        "breakfast_id": plans[index].breakfast_id,
+                        "lunch_id": plans[index].lunch_id,
+                        "dinner_id": plans[index].dinner_id,
+                        "updated_at": now,
+                    }
+                    for index in accepted
+                ],
+            )
+        }
+
+        replaced = [plan_ids[plan_date] for plan_date in dates if plan_date in existing]
+        for chunk in _chunks(replaced):
+            db.execute(
+                delete(models.mealplan_snacks).where(
+                    models.mealplan_snacks.c.mealplan_id.in_(chunk)
+                )
+            )
+        snacks = [
+            {"mealplan_id": plan_ids[plans[index].date], "meal_id": meal_id}
+            for index in accepted
+            for meal_id in dict.fromkeys(plans[index].snack_ids)
+        ]
+        if snacks:
+            db.execute(insert(models.mealplan_snacks), snacks)
+        refresh_meal_plan_week_summaries(db, user_id, min(dates), max(dates))
+        db.commit()
+
+        for index in accepted:
+            plan_date = plans[index].date
+            items[index] = schemas.BulkItemResult(
+                index=index,
+                status=schemas.BulkItemStatus.UPDATED
+                if plan_date in existing
+                else schemas.BulkItemStatus.CREATED,
+                id=plan_ids[plan_date],
+            )
+
+    statuses = [item.status for item in items]
+    return schemas.BulkResult(
+        created=statuses.count(schemas.BulkItemStatus.CREATED),
+        updated=statuses.count(schemas.BulkItemStatus.UPDATED),
+        rejected=statuses.count(schemas.BulkItemStatus.REJECTED),
+        items=items,
+    )
+
+
+def search_meals(
+    db: Session,
+    user_id: int,
+    query: str,
+    meal_type: schemas.MealType | None = None,
+    limit: int = 20,
+) -> list[models.Meal]:
+    """
+    Returns the user's meals whose name or description contains words starting
+    with every word of the query, best matches first.
+
+    Every word is matched as a prefix, so partial input autocompletes. On SQLite
+    the FTS5 index is used, and meals matching on their name come first, shortest
+    name first; BM25 is avoided because it reads every match in the whole table to
+    weigh the terms. Words are matched on at most their first
+    `SEARCH_PREFIX_LENGTH` characters. On PostgreSQL the full-text GIN index is
+    used, ranked by `ts_rank`.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The ID of the user whose meals to search.
+        query (str): The search text.
+        meal_type (MealType | None, optional): Only return meals of this type.
+        limit (int, optional): The maximum number of meals. Defaults to 20.
+
+    Returns:
+        list[Meal]: The matching meals.
+    """
+    terms = SEARCH_TERM.findall(query.lower())
+    if not terms:
+        return []
+
+    if db.get_bind().dialect.name == "postgresql":
+        document = text(models.meal_plan.MEALS_SEARCH_DOCUMENT)
+        tsquery = func.to_tsquery(
+            literal_column("'simple'"), " & ".join(f"{term}:*" for term in terms)
+        )
+        statement = (
+            select(models.Meal)
+            .where(models.Meal.user_id == user_id, document.op("@@")(tsquery))
+            .order_by(func.ts_rank(document, tsquery).desc(), models.Meal.id)
+        )
+        if meal_type is not None:
+            statement = statement.where(models.Meal.meal_type == meal_type.value)
+        return db.scalars(statement.limit(limit)).all()
+
+    # Terms are quoted so that FTS5 operators in the input are matched literally.
+    words = " AND ".join(f'"{term[:SEARCH_PREFIX_LENGTH]}"*' for term in terms)
+    scope = f'user_id : "{user_id}"'
+    name_matches = (
+        select(meals_fts.c.rowid)
+        .where(meals_fts.c.meals_fts.op("MATCH")(f"{scope} AND name : ({words})"))
+        .correlate(None)
+    )
+    statement = (
+        select(models.Meal)
+        .join_from(meals_fts, models.Meal, models.Meal.id == meals_fts.c.rowid)
+        .where(
+            meals_fts.c.meals_fts.op("MATCH")(
+                f"{scope} AND {{name description}} : ({words})"
+            )
+        )
+        .order_by(
+            models.Meal.id.not_in(name_matches),
+            func.length(models.Meal.name),
+            models.Meal.id,
+        )
+        .limit(limit)
     )
+    if meal_type is not None:
+        # Checked on the user's matching rows rather than in the index, where each
+        # type's doclist spans every user's meals.
+        statement = statement.where(models.Meal.meal_type == meal_type.value)
+    return db.scalars(statement).all()
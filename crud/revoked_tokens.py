@@ -0,0 +1,73 @@
+from datetime import datetime
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .. import models
+
+
+def revoke_token(db: Session, jti: str, expires_at: datetime) -> None:
+    """
+    Records the token as revoked until it expires.
+
+    Revoking an already revoked token does nothing.
+
+    Args:
+        db (Session): The database session.
+        jti (str): The token's `jti` claim.
+        expires_at (datetime): The token's expiry, in UTC.
+    """
+    db.add(models.RevokedToken(jti=jti, expires_at=expires_at))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+
+
+def get_revoked_tokens(
+    db: Session, after_id: int = 0
+) -> list[tuple[int, str, datetime]]:
+    """
+    Returns the unexpired revoked tokens recorded after the given row.
+
+    Args:
+        db (Session): The database session.
+        after_id (int, optional): Only return rows with a greater ID, i.e. those
+            recorded since a previous call. Defaults to 0.
+
+    Returns:
+        list[tuple[int, str, datetime]]: The row ID, `jti` and expiry of each
+            token, in ID order.
+    """
+    statement = (
+        select(
+            models.RevokedToken.id,
+            models.RevokedToken.jti,
+            models.RevokedToken.expires_at,
+        )
+        .where(
+            models.RevokedToken.id > after_id,
+            models.RevokedToken.expires_at > datetime.utcnow(),
+        )
+        .order_by(models.RevokedToken.id)
+    )
+    return [tuple(row) for row in db.execute(statement)]
+
+
+def delete_expired_revoked_tokens(db: Session) -> int:
+    """
+    Deletes the revoked tokens that have expired since.
+
+    Args:
+        db (Session): The database session.
+
+    Returns:
+        int: The number of rows deleted.
+    """
+    result = db.execute(
+        delete(models.RevokedToken).where(
+            models.RevokedToken.expires_at <= datetime.utcnow()
+        )
+    )
+    db.commit()
+    return result.rowcount
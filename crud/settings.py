@@ -1,28 +1,184 @@
+import os
+
+from sqlalchemy import event, select, update
 from sqlalchemy.orm import Session
 from .. import schemas
 from .. import models
+from ..cache import make_cache
+from ..database import state_path
+from ..metrics import register_cache
+
+SETTINGS_CACHE_BACKEND = os.getenv("SETTINGS_CACHE_BACKEND", "memory")
+SETTINGS_CACHE_PATH = os.getenv("SETTINGS_CACHE_PATH") or state_path("settings_cache")
+SETTINGS_CACHE_SIZE = int(os.getenv("SETTINGS_CACHE_SIZE", "10000"))
+SETTINGS_CACHE_TTL = float(os.getenv("SETTINGS_CACHE_TTL", "300"))
+
+# The settings a user may change; the primary key is the user's id and the version
+# is maintained by `set_user_settings`.
+SETTING_KEYS = frozenset(
+    column.key
+    for column in models.Settings.__table__.columns
+    if not column.primary_key and column.key != "version"
+)
+
+SETTINGS_COLUMNS = tuple(column.key for column in models.Settings.__table__.columns)
+
+# Settings rows keyed by user id, as dicts of their column values. Only the async
+# wrappers in `crud.aio` read and fill the entries, once per call and off the event
+# loop when the backend blocks. Every committed change drops or replaces them: a
+# cached version never wins over a committed one.
+settings_cache = make_cache(
+    SETTINGS_CACHE_BACKEND,
+    maxsize=SETTINGS_CACHE_SIZE,
+    ttl=SETTINGS_CACHE_TTL,
+    path=SETTINGS_CACHE_PATH,
+)
+register_cache("settings", settings_cache)
+
+
+def cached_user_settings(user_id: int) -> models.Settings | None:
+    """
+    Returns the user's settings from the cache, without touching the database.
+
+    Args:
+        user_id (int): The ID of the user.
+
+    Returns:
+        Settings | None: A detached copy of the settings, or None on a miss.
+    """
+    values = settings_cache.get(user_id)
+    if values is None:
+        return None
+    return models.Settings(**values)
+
+
+def cache_user_settings(db_settings: models.Settings, replace: bool = False) -> None:
+    """
+    Stores the settings in the cache.
+
+    Args:
+        db_settings (Settings): The settings, as just read or created.
+        replace (bool, optional): Whether to replace any cached entry, for settings
+            just committed. Defaults to False, which keeps a newer cached version:
+            a concurrent read may have cached the row of a later write.
+    """
+    if not replace:
+        cached = settings_cache.peek(db_settings.id)
+        if cached is not None and cached["version"] > db_settings.version:
+            return
+    settings_cache.set(
+        db_settings.id,
+        {column: getattr(db_settings, column) for column in SETTINGS_COLUMNS},
+    )
+
+
+@event.listens_for(models.Settings, "after_update")
+@event.listens_for(models.Settings, "after_delete")
+def _invalidate_cached_settings(mapper, connection, target) -> None:
+    settings_cache.delete(target.id)
 
 
 def get_user_settings(user_id: int, db: Session) -> models.Settings:
+    """
+    Returns the user's settings, creating the defaults if the user has none.
+
+    Always reads the database; `crud.aio.get_user_settings` serves them from
+    `settings_cache` when possible.
+
+    Args:
+        user_id (int): The ID of the user.
+        db (Session): The database session.
+
+    Returns:
+        Settings: The user's settings.
+    """
     result = db.query(models.Settings).filter(models.Settings.id == user_id).first()
     if result is None:
         return create_user_settings(db, user_id)
     return result
 
 
+def get_user_settings_version(user_id: int, db: Session) -> int | None:
+    """
+    Returns the version of the user's settings without loading them.
+
+    Args:
+        user_id (int): The ID of the user.
+        db (Session): The database session.
+
+    Returns:
+        int | None: The version, or None if the user has no settings yet.
+    """
+    return db.scalar(
+        select(models.Settings.version).where(models.Settings.id == user_id)
+    )
+
+
 def set_user_setting(
     user_id: int, setting: schemas.Setting, db: Session
 ) -> schemas.Setting | None:
-    db_settings = get_user_settings(user_id, db)
-    print(db_settings.theme_mode)
-    if db_settings is None:
+    if set_user_settings(user_id, [setting], db) is None:
         return None
-    if not hasattr(db_settings, setting.key):
+    return setting
+
+
+def set_user_settings(
+    user_id: int, settings: list[schemas.Setting], db: Session
+) -> models.Settings | None:
+    """
+    Applies several settings at once, as `update_user_settings` does, then drops
+    the user's cached settings.
+
+    Args:
+        user_id (int): The ID of the user whose settings to change.
+        settings (list[Setting]): The settings to apply.
+        db (Session): The database session.
+
+    Returns:
+        Settings | None: The updated settings, or None if any key is not a setting.
+    """
+    db_settings = update_user_settings(user_id, settings, db)
+    if db_settings is not None:
+        settings_cache.delete(user_id)
+    return db_settings
+
+
+def update_user_settings(
+    user_id: int, settings: list[schemas.Setting], db: Session
+) -> models.Settings | None:
+    """
+    Applies several settings at once, in a single UPDATE and transaction.
+
+    Either every setting is applied or none is: if any key is not a setting,
+    nothing is written. The UPDATE fires no ORM events, so the cached settings are
+    left to the caller: `set_user_settings` drops them, and so does
+    `crud.aio.set_user_settings`, off the event loop.
+
+    Args:
+        user_id (int): The ID of the user whose settings to change.
+        settings (list[Setting]): The settings to apply.
+        db (Session): The database session.
+
+    Returns:
+        Settings | None: The updated settings, or None if any key is not a setting.
+    """
+    values = {setting.key: setting.value for setting in settings}
+    if not values.keys() <= SETTING_KEYS:
         return None
-    setattr(db_settings, setting.key, setting.value)
+    if not values:
+        return get_user_settings(user_id, db)
+
+    db_settings = db.scalars(
+        update(models.Settings)
+        .where(models.Settings.id == user_id)
+        .values(**values, version=models.Settings.version + 1)
+        .returning(models.Settings)
+    ).first()
+    if db_settings is None:
+        db_settings = models.Settings(id=user_id, **values)
+        db.add(db_settings)
     db.commit()
-    db.refresh(db_settings)
-    return setting
+    return db_settings
 
 
 def create_user_settings(db: Session, user_id: int):
@@ -1,8 +1,25 @@
+import sys
+
+from sqlalchemy import func, select, text, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from .. import schemas
 from .. import models
 
 
+class DuplicateUserError(Exception):
+    """
+    Raised when creating a user whose username or email is already registered.
+
+    Args:
+        field (str): The taken field, "username" or "email".
+    """
+
+    def __init__(self, field: str):
+        super().__init__(f"{field} already registered")
+        self.field = field
+
+
 def get_user(db: Session, user_id: int):
     """
     Returns the user with the specified ID.
@@ -42,31 +59,88 @@ def get_user_by_username(db: Session, username: str):
     Returns:
         User | None: The user with the specified username, or None if no user has the specified username.
     """
-    result = db.query(models.User).filter(models.User.username == username).first()
-    print(result)
-    result = db.query(models.User).all()
-    print(result)
     return db.query(models.User).filter(models.User.username == username).first()
 
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
+def _prefix_upper_bound(prefix: str) -> str | None:
+    # The smallest string greater than every string starting with the prefix, so
+    # that the prefix match is an index range; None if there is no such string.
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def get_users(
+    db: Session,
+    after_id: int | None = None,
+    limit: int = 100,
+    is_active: bool | None = None,
+    username_prefix: str | None = None,
+) -> list[models.User]:
     """
-    Returns a list of users.
+    Returns a page of users in ID order.
+
+    Pages are fetched by keyset: pass the last ID of a page as `after_id` to get
+    the next one, so that every page costs the same index seek however deep it is.
 
     Args:
         db (Session): The database session.
-        skip (int, optional): The number of users to skip. Defaults to 0.
+        after_id (int | None, optional): Only return users with a greater ID.
+            Defaults to the first page.
         limit (int, optional): The maximum number of users to return. Defaults to 100.
+        is_active (bool | None, optional): Only return active, or inactive, users.
+        username_prefix (str | None, optional): Only return users whose username
+            starts with this, case-sensitively.
 
     Returns:
-        list: A list of users.
+        list[User]: The users.
+    """
+    statement = select(models.User).order_by(models.User.id).limit(limit)
+    if after_id is not None:
+        statement = statement.where(models.User.id > after_id)
+    if is_active is not None:
+        statement = statement.where(models.User.is_active == is_active)
+    if username_prefix:
+        statement = statement.where(models.User.username >= username_prefix)
+        upper_bound = _prefix_upper_bound(username_prefix)
+        if upper_bound is not None:
+            statement = statement.where(models.User.username < upper_bound)
+    return db.scalars(statement).all()
+
+
+def get_user_count_estimate(db: Session) -> int:
     """
-    return db.query(models.User).offset(skip).limit(limit).all()
+    Returns an estimate of the number of users, without counting them.
+
+    On PostgreSQL this is the planner's row estimate from the last ANALYZE; other
+    databases use the highest user ID, which overestimates by the number of
+    deleted users.
+
+    Args:
+        db (Session): The database session.
+
+    Returns:
+        int: The estimated number of users.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        estimate = db.scalar(
+            text("SELECT reltuples FROM pg_class WHERE oid = 'users'::regclass")
+        )
+        # -1 until the table is first analyzed.
+        if estimate is not None and estimate >= 0:
+            return int(estimate)
+    return db.scalar(select(func.max(models.User.id))) or 0
 
 
 def create_user(db: Session, user: schemas.UserCreate):
     """
-    Creates a user.
+    Creates a user with the default settings, in one transaction. The settings
+    are the created user's `settings[0]`.
+
+    Duplicates are detected by the unique constraints rather than by looking the
+    username and email up first, so a new user costs only the two INSERTs, and two
+    concurrent signups can't both take the same name.
 
     Args:
         db (Session): The database session.
@@ -74,14 +148,43 @@ def create_user(db: Session, user: schemas.UserCreate):
 
     Returns:
         User: The created user.
+
+    Raises:
+        DuplicateUserError: If the username or email is already registered.
     """
     db_user = models.User(
         username=user.username,
         email=user.email,
         full_name=user.full_name,
         hashed_password=user.hashed_password,
+        settings=[models.Settings()],
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        # Only on failure: find out which constraint it was.
+        taken = get_user_by_username(db, username=user.username) is not None
+        raise DuplicateUserError("username" if taken else "email") from None
+    # The session doesn't expire on commit and every column was set on insert, so
+    # the objects are complete without a refresh.
     return db_user
+
+
+def update_user_password_hash(db: Session, user_id: int, hashed_password: str):
+    """
+    Replaces the user's password hash.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The ID of the user.
+        hashed_password (str): The new hash.
+    """
+    db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(hashed_password=hashed_password)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
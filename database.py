@@ -1,16 +1,289 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import hashlib
+import os
+import tempfile
+import time
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from jose import JWTError, jwt
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.sql.dml import UpdateBase
+
+from .cache import call_cache, make_cache
+from .metrics import DB_POOL_CHECKOUT_WAIT, register_cache
+
+
+def env_flag(name: str, default: bool) -> bool:
+    """
+    Returns whether the environment variable is set to a true value.
+
+    Args:
+        name (str): The name of the environment variable.
+        default (bool): The value to use when the variable is not set.
+
+    Returns:
+        bool: True for "1", "true" or "yes", in any case.
+    """
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes")
+
+
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./assistant.db")
+
+
+def state_path(name: str) -> str:
+    """
+    Returns the default file of a "sqlite" cache or limiter: one per database, in
+    the temporary directory, so that the workers of a deployment share it and
+    other deployments on the host, using other databases, don't.
+
+    Args:
+        name (str): What the file holds, e.g. "settings_cache".
+
+    Returns:
+        str: The path of the file.
+    """
+    url = make_url(SQLALCHEMY_DATABASE_URL)
+    if url.get_backend_name() == "sqlite" and url.database:
+        # The same relative path from two working directories is two databases.
+        url = url.set(database=os.path.abspath(url.database))
+    digest = hashlib.sha256(url.render_as_string().encode()).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"assistant_api_{name}_{digest}.db")
+
+
+# Async drivers used for each sync backend: aiosqlite locally, asyncpg in production.
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+USE_ASYNC_DB = env_flag("USE_ASYNC_DB", True)
+
+# A replica that GET requests read from; unset, everything uses DATABASE_URL.
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL")
+# After a user writes, their reads stay on the primary for this long, so that they
+# see their own changes however far the replica lags.
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+READ_YOUR_WRITES_BACKEND = os.getenv("READ_YOUR_WRITES_BACKEND", "memory")
+READ_YOUR_WRITES_PATH = os.getenv("READ_YOUR_WRITES_PATH") or state_path(
+    "recent_writers"
+)
+READ_YOUR_WRITES_SIZE = int(os.getenv("READ_YOUR_WRITES_SIZE", "100000"))
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_PRE_PING = env_flag("DB_POOL_PRE_PING", False)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+
+# Applied to every new SQLite connection. WAL lets readers proceed while a writer
+# commits, and NORMAL sync only fsyncs at checkpoints, which is durable in WAL mode
+# against application crashes. Set SQLITE_TUNING=false to keep SQLite's defaults.
+SQLITE_TUNING = env_flag("SQLITE_TUNING", True)
+SQLITE_PRAGMAS = {
+    # First, so that switching to WAL waits for other processes opening the file.
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # Negative values are in KiB: 64 MiB of page cache per connection.
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+}
+
+
+class _TimedCheckoutMixin:
+    """
+    Records how long each checkout waits for a connection in
+    `db_pool_checkout_wait_seconds`, labelled with `pool_label`.
+    """
+
+    pool_label = "sync"
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./assistant.db"
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start, self.pool_label)
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pool_label = "async"
+
+
+def to_async_url(url: str) -> str:
+    """
+    Returns the async driver equivalent of a sync database URL.
+
+    Args:
+        url (str): The sync database URL.
+
+    Returns:
+        str: The same URL using the matching async driver.
+    """
+    sync_url = make_url(url)
+    drivername = ASYNC_DRIVERS.get(sync_url.drivername, sync_url.drivername)
+    return sync_url.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+def engine_options(url: str) -> dict:
+    """
+    Returns the `create_engine` keyword arguments configured for the URL.
+
+    Args:
+        url (str): The database URL.
+
+    Returns:
+        dict: The pool settings, with a pool class timing checkouts, plus the
+            SQLite connect arguments for SQLite URLs.
+    """
+    database_url = make_url(url)
+    poolclass = (
+        TimedAsyncAdaptedQueuePool
+        if database_url.get_dialect().is_async
+        else TimedQueuePool
+    )
+    options: dict = {
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+    pool_options = {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+    }
+    if database_url.get_backend_name() != "sqlite":
+        return options | pool_options
+
+    options["connect_args"] = {"check_same_thread": False}
+    if database_url.database in (None, "", ":memory:"):
+        return options
+    # aiosqlite would otherwise default to NullPool, which opens a connection (and
+    # its worker thread) for every session.
+    return options | pool_options
+
+
+def set_sqlite_pragmas(engine: Engine, pragmas: dict[str, str | int]) -> None:
+    """
+    Applies the pragmas to every connection the engine opens.
+
+    Args:
+        engine (Engine): The engine, or an async engine's `sync_engine`.
+        pragmas (dict[str, str | int]): The pragma names and values.
+    """
+
+    @event.listens_for(engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+ASYNC_SQLALCHEMY_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL", to_async_url(SQLALCHEMY_DATABASE_URL)
+)
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL)
+)
+# Objects are serialized after the crud call returns, outside the threadpool or
+# greenlet that ran it, so they must not expire and reload on commit.
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=engine
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL, **engine_options(ASYNC_SQLALCHEMY_DATABASE_URL)
+)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
+read_engine = async_read_engine = None
+if READ_DATABASE_URL:
+    ASYNC_READ_DATABASE_URL = os.getenv(
+        "ASYNC_READ_DATABASE_URL", to_async_url(READ_DATABASE_URL)
+    )
+    read_engine = create_engine(READ_DATABASE_URL, **engine_options(READ_DATABASE_URL))
+    async_read_engine = create_async_engine(
+        ASYNC_READ_DATABASE_URL, **engine_options(ASYNC_READ_DATABASE_URL)
+    )
+
+if SQLITE_TUNING:
+    for sqlite_engine in (engine, async_engine, read_engine, async_read_engine):
+        sqlite_engine = getattr(sqlite_engine, "sync_engine", sqlite_engine)
+        if sqlite_engine is not None and sqlite_engine.dialect.name == "sqlite":
+            set_sqlite_pragmas(sqlite_engine, SQLITE_PRAGMAS)
+
+
+class RoutingSession(Session):
+    """
+    A session that reads from the replica until it first writes.
+
+    Flushes and INSERT, UPDATE or DELETE statements go to the session's `bind`, the
+    primary, and so does every statement after them, so a session always reads
+    what it has written. Writes through `text()` are not recognized; run them in a
+    primary session.
+
+    Args:
+        read_bind (Engine): The replica's engine, or an async engine's
+            `sync_engine`.
+    """
+
+    def __init__(self, *args, read_bind: Engine, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.read_bind = read_bind
+        self.wrote = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.wrote = True
+        if self.wrote:
+            return super().get_bind(mapper, clause=clause, **kwargs)
+        return self.read_bind
+
+
+ReadSessionLocal = AsyncReadSessionLocal = None
+if READ_DATABASE_URL:
+    ReadSessionLocal = sessionmaker(
+        class_=RoutingSession,
+        read_bind=read_engine,
+        autocommit=False,
+        autoflush=False,
+        expire_on_commit=False,
+        bind=engine,
+    )
+    AsyncReadSessionLocal = async_sessionmaker(
+        sync_session_class=RoutingSession,
+        read_bind=async_read_engine.sync_engine,
+        bind=async_engine,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+# The usernames that wrote within READ_YOUR_WRITES_SECONDS; see `get_async_db`.
+# Accessed through `cache.call_cache`, as every request with a replica reads it.
+recent_writers = make_cache(
+    READ_YOUR_WRITES_BACKEND,
+    maxsize=READ_YOUR_WRITES_SIZE,
+    ttl=READ_YOUR_WRITES_SECONDS,
+    path=READ_YOUR_WRITES_PATH,
+)
+register_cache("recent_writers", recent_writers)
 
 Base = declarative_base()
 
+DBSession = Session | AsyncSession
+
 
 def get_db():
     db = SessionLocal()
@@ -18,3 +291,114 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def request_username(request: Request) -> str | None:
+    """
+    Returns the subject of the request's bearer token, without verifying it.
+
+    Only used to pick the database a request reads from: a forged token can at
+    worst send that user's reads to the primary for a while, and is then rejected
+    by authentication as usual.
+
+    Args:
+        request (Request): The request.
+
+    Returns:
+        str | None: The username, or None if the request has no readable token.
+    """
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.get_unverified_claims(token).get("sub")
+    except JWTError:
+        return None
+
+
+async def record_write(username: str) -> None:
+    """
+    Keeps the user's reads on the primary for `READ_YOUR_WRITES_SECONDS`.
+
+    Requests other than GET and HEAD are recorded by `get_async_db`; call this for
+    writes it can't attribute, such as a signup.
+
+    Args:
+        username (str): The user who wrote.
+    """
+    if READ_DATABASE_URL:
+        await call_cache(recent_writers, recent_writers.set, username, True)
+
+
+async def reads_from_replica(request: Request | None) -> bool:
+    """
+    Returns whether the request should read from the replica, recording it as a
+    write of its user otherwise.
+
+    Args:
+        request (Request | None): The request, or None outside of one.
+
+    Returns:
+        bool: True for GET and HEAD requests of users who haven't written
+            recently, when a replica is configured.
+    """
+    if not READ_DATABASE_URL or request is None:
+        return False
+    username = request_username(request)
+    if request.method not in ("GET", "HEAD"):
+        if username is not None:
+            # Recorded before the write, as the cleanup of a dependency runs after
+            # the response is sent, when the next request may already be in.
+            await record_write(username)
+        return False
+    if username is None:
+        return True
+    return await call_cache(recent_writers, recent_writers.get, username) is None
+
+
+async def get_async_db(request: Request = None):
+    """
+    Yields the session used by the API routes.
+
+    An `AsyncSession` is used by default; setting `USE_ASYNC_DB=false` falls back to
+    the sync `SessionLocal`, whose work is then run in the threadpool by `run_sync`.
+
+    With `READ_DATABASE_URL` set, GET and HEAD requests get a `RoutingSession`,
+    which reads from the replica, unless their user wrote in the last
+    `READ_YOUR_WRITES_SECONDS`.
+
+    Args:
+        request (Request, optional): The request, injected by FastAPI. Defaults to
+            None, which uses the primary.
+    """
+    replica = await reads_from_replica(request)
+    if not USE_ASYNC_DB:
+        db = ReadSessionLocal() if replica else SessionLocal()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+        return
+
+    async with (AsyncReadSessionLocal() if replica else AsyncSessionLocal()) as db:
+        yield db
+
+
+async def run_sync(db: DBSession, fn, /, *args, **kwargs):
+    """
+    Runs a sync crud function without blocking the event loop.
+
+    The function is called with the sync session as its `db` keyword argument.
+    With an `AsyncSession` it runs through `AsyncSession.run_sync` on the async
+    driver; with a sync `Session` it is dispatched to the threadpool.
+
+    Args:
+        db (Session | AsyncSession): The database session.
+        fn (Callable): The sync crud function to run.
+
+    Returns:
+        Any: The return value of the function.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(lambda session: fn(*args, db=session, **kwargs))
+    return await run_in_threadpool(fn, *args, db=db, **kwargs)
@@ -0,0 +1,187 @@
+"""
+Password hashing, run off the event loop.
+
+bcrypt is deliberately slow, so hashing and verifying are sent to a process pool
+(one worker per core by default) instead of running inside the request handlers.
+At most `PASSWORD_HASH_MAX_CONCURRENCY` operations run at once and at most
+`PASSWORD_HASH_MAX_QUEUE` wait for a slot; past that, callers get a 503 so a login
+storm degrades cleanly instead of freezing the API.
+
+Workers are started with the "spawn" method and only import this module, which
+depends on nothing but passlib, FastAPI and `metrics`, so they start cheaply and
+never inherit the parent's database connections or event loop.
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from .metrics import PASSWORD_HASH_DURATION, PASSWORD_HASH_REJECTED
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+PASSWORD_HASH_MAX_CONCURRENCY = int(
+    os.getenv("PASSWORD_HASH_MAX_CONCURRENCY", max(PASSWORD_HASH_WORKERS, 1))
+)
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+# bcrypt's cost: each increment doubles the time to hash and verify. Pick it with
+# `python -m assistant_api.calibrate`. Hashes made with another cost are replaced
+# at their user's next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS
+)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verifies that the plain password matches the hashed password.
+
+    Args:
+        plain_password (str): The plain password.
+        hashed_password (str): The hashed password.
+
+    Returns:
+        bool: True if the plain password matches the hashed password, False otherwise.
+    """
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """
+    Verifies the password and, if it matches a hash made with outdated settings,
+    hashes it again with the current ones.
+
+    Args:
+        plain_password (str): The plain password.
+        hashed_password (str): The hashed password.
+
+    Returns:
+        tuple[bool, str | None]: Whether the password matches, and the new hash
+            to store if the old one is outdated.
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def get_password_hash(password: str) -> str:
+    """
+    Returns the hashed password.
+
+    Args:
+        password (str): The password to hash.
+
+    Returns:
+        str: The hashed password.
+    """
+    return pwd_context.hash(password)
+
+
+class PasswordHasher:
+    """
+    Runs password hashing in a bounded worker pool.
+
+    Args:
+        workers (int): The number of worker processes. 0 uses the event loop's
+            default thread pool instead of a process pool.
+        max_concurrency (int): The maximum number of operations running at once.
+        max_queue (int): The maximum number of operations waiting for a slot.
+    """
+
+    def __init__(self, workers: int, max_concurrency: int, max_queue: int):
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._executor: Executor | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._waiting = 0
+
+    def _get_executor(self) -> Executor | None:
+        if self.workers > 0 and self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _run(self, operation: str, fn, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            PASSWORD_HASH_REJECTED.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many password operations in progress",
+                headers={"Retry-After": "1"},
+            )
+
+        start = time.perf_counter()
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._semaphore.release()
+            PASSWORD_HASH_DURATION.observe(time.perf_counter() - start, operation)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """
+        Verifies that the plain password matches the hashed password.
+
+        Raises:
+            HTTPException: If the pool queue is full.
+        """
+        return await self._run(
+            "verify", verify_password, plain_password, hashed_password
+        )
+
+    async def verify_and_update(
+        self, plain_password: str, hashed_password: str
+    ) -> tuple[bool, str | None]:
+        """
+        Verifies the password, and rehashes it if its hash is outdated.
+
+        Returns:
+            tuple[bool, str | None]: Whether the password matches, and the new
+                hash to store if the old one is outdated.
+
+        Raises:
+            HTTPException: If the pool queue is full.
+        """
+        return await self._run(
+            "verify", verify_and_update_password, plain_password, hashed_password
+        )
+
+    async def hash(self, password: str) -> str:
+        """
+        Returns the hashed password.
+
+        Raises:
+            HTTPException: If the pool queue is full.
+        """
+        return await self._run("hash", get_password_hash, password)
+
+    def shutdown(self) -> None:
+        """
+        Stops the worker processes. The pool is recreated on next use.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        self._semaphore = None
+
+
+password_hasher = PasswordHasher(
+    workers=PASSWORD_HASH_WORKERS,
+    max_concurrency=PASSWORD_HASH_MAX_CONCURRENCY,
+    max_queue=PASSWORD_HASH_MAX_QUEUE,
+)
@@ -0,0 +1,154 @@
+"""
+Per-request SQL statement counting and HTTP metrics.
+
+Engine events count every statement and its duration against the request that
+issued it. `InstrumentationMiddleware` records each request's latency, status and
+statement totals per route template in `metrics`, and exposes the statement totals
+as `X-DB-Query-Count` and `X-DB-Time` response headers when `DEBUG` is set.
+"""
+import threading
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+from .database import env_flag
+from .metrics import (
+    DB_STATEMENT_DURATION,
+    HTTP_REQUEST_DB_DURATION,
+    HTTP_REQUEST_DB_STATEMENTS,
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS,
+    HTTP_REQUESTS_IN_PROGRESS,
+)
+
+DEBUG = env_flag("DEBUG", False)
+
+
+class QueryStats:
+    """
+    The statements run during a request or a capture block.
+
+    Args:
+        capture (bool, optional): Whether to keep each statement, its parameters and
+            the engine that ran it. Defaults to False.
+    """
+
+    def __init__(self, capture: bool = False):
+        self.capture = capture
+        self.count = 0
+        self.duration = 0.0
+        self.statements: list[tuple[str, object, Engine]] = []
+
+    def record(self, statement: str, parameters, engine: Engine, duration: float):
+        self.count += 1
+        self.duration += duration
+        if self.capture:
+            self.statements.append((statement, parameters, engine))
+
+
+_request_stats: ContextVar[QueryStats | None] = ContextVar(
+    "request_query_stats", default=None
+)
+_captures: set[QueryStats] = set()
+_captures_lock = threading.Lock()
+
+STATEMENT_TYPES = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE"})
+
+
+def statement_type(statement: str) -> str:
+    """
+    Returns the statement's leading keyword, or "OTHER" for anything but
+    SELECT, INSERT, UPDATE and DELETE, to keep the metric's labels bounded.
+    """
+    keyword = statement.lstrip()[:6].upper()
+    return keyword if keyword in STATEMENT_TYPES else "OTHER"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_start"].pop()
+    DB_STATEMENT_DURATION.observe(duration, statement_type(statement))
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.record(statement, parameters, conn.engine, duration)
+    for capture in tuple(_captures):
+        capture.record(statement, parameters, conn.engine, duration)
+
+
+class capture_queries:
+    """
+    Context manager recording every statement run in this process while active,
+    whichever thread or event loop runs it.
+
+    Yields:
+        QueryStats: The statements recorded so far.
+    """
+
+    def __enter__(self) -> QueryStats:
+        self.stats = QueryStats(capture=True)
+        with _captures_lock:
+            _captures.add(self.stats)
+        return self.stats
+
+    def __exit__(self, *exc_info) -> None:
+        with _captures_lock:
+            _captures.discard(self.stats)
+
+
+class InstrumentationMiddleware:
+    """
+    ASGI middleware recording each request's latency, status and statements.
+
+    Args:
+        app (ASGIApp): The wrapped application.
+        expose_headers (bool, optional): Whether to add the `X-DB-Query-Count` and
+            `X-DB-Time` (milliseconds) headers. Defaults to `DEBUG`.
+    """
+
+    def __init__(self, app, expose_headers: bool = DEBUG):
+        self.app = app
+        self.expose_headers = expose_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        stats = QueryStats()
+        token = _request_stats.set(stats)
+
+        async def send_with_headers(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.expose_headers:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("X-DB-Query-Count", str(stats.count))
+                    headers.append("X-DB-Time", f"{stats.duration * 1000:.3f}")
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            duration = time.perf_counter() - start
+            _request_stats.reset(token)
+            HTTP_REQUESTS_IN_PROGRESS.dec(method)
+            # The template, not the path, so that path parameters don't multiply
+            # the label values.
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            HTTP_REQUESTS.inc(method, route, str(status_code))
+            HTTP_REQUEST_DURATION.observe(duration, method, route)
+            HTTP_REQUEST_DB_STATEMENTS.observe(stats.count, route)
+            HTTP_REQUEST_DB_DURATION.observe(stats.duration, route)
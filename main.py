@@ -1,23 +1,44 @@
-from fastapi import FastAPI
-from dotenv import load_dotenv
-import uvicorn
+from contextlib import asynccontextmanager
 
-from . import models
-from .routers import users, auth, meal_plan
-from .database import engine
+from dotenv import load_dotenv
 
+# Before the imports below, which read their configuration from the environment.
 load_dotenv()
 
-models.Base.metadata.create_all(bind=engine)
+from fastapi import FastAPI  # noqa: E402
+from fastapi.concurrency import run_in_threadpool  # noqa: E402
+from fastapi.responses import ORJSONResponse  # noqa: E402
 
-app = FastAPI()
+from . import models  # noqa: E402
+from .routers import users, auth, meal_plan, meals, metrics  # noqa: E402
+from .database import engine, env_flag  # noqa: E402
+from .hashing import password_hasher  # noqa: E402
+from .instrumentation import InstrumentationMiddleware  # noqa: E402
+from .revocation import start_revocation_refresh  # noqa: E402
 
-app.include_router(users.router)
-app.include_router(auth.router)
-app.include_router(meal_plan.router)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Runs the startup work once per process, and the cleanup at shutdown.
+
+    Tables are only created when `DB_CREATE_ALL` is set; otherwise the schema is
+    left to Alembic.
+
+    Args:
+        app (FastAPI): The application.
+    """
+    if env_flag("DB_CREATE_ALL", False):
+        await run_in_threadpool(models.Base.metadata.create_all, bind=engine)
+    revocation_refresh = await start_revocation_refresh()
+    try:
+        yield
+    finally:
+        revocation_refresh.cancel()
+        # Stops the password hashing worker processes.
+        password_hasher.shutdown()
 
 
-@app.get("/")
 async def root():
     """
     Returns a JSON object with a "message" key and the value "Hello World".
@@ -28,5 +49,38 @@ async def root():
     return {"message": "Hello World"}
 
 
+def create_app() -> FastAPI:
+    """
+    Returns a new application.
+
+    Creating it touches neither the database nor the password hashing workers;
+    that happens in `lifespan` when the server starts it.
+
+    Returns:
+        FastAPI: The application.
+    """
+    app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+    app.add_middleware(InstrumentationMiddleware)
+
+    app.include_router(users.router)
+    app.include_router(auth.router)
+    app.include_router(meal_plan.router)
+    app.include_router(meals.router)
+    app.include_router(metrics.router)
+    app.get("/")(root)
+    return app
+
+
+def __getattr__(name: str):
+    # Builds `main:app` on first access, so that importing this module for
+    # `create_app` doesn't build an application that goes unused.
+    if name == "app":
+        app = globals()["app"] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    import uvicorn
+
+    uvicorn.run(create_app(), host="0.0.0.0", port=8000)
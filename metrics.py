@@ -0,0 +1,262 @@
+"""
+Minimal in-process metrics rendered in the Prometheus text format.
+
+Observations are a dict lookup and a few additions under a lock, cheap enough to
+leave on in production. Metrics are per process: with several workers, scrape each
+one or aggregate them in Prometheus.
+"""
+import bisect
+import threading
+from typing import Callable, Iterable
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+_metrics: list["Metric"] = []
+_collectors: list[Callable[[], None]] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: tuple[str, ...], labelvalues: tuple, extra: str = ""):
+    pairs = [
+        f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Base class for metrics; registers the metric for `render`.
+
+    Args:
+        name (str): The metric name.
+        documentation (str): The help text.
+        labelnames (Iterable[str], optional): The label names. Defaults to none.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple, float] = {}
+        _metrics.append(self)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = dict(self._values)
+        for labelvalues, value in sorted(values.items()):
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Counter(Metric):
+    """
+    A value that only goes up.
+    """
+
+    type = "counter"
+
+    def inc(self, *labelvalues, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down.
+    """
+
+    type = "gauge"
+
+    def inc(self, *labelvalues, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def dec(self, *labelvalues, amount: float = 1) -> None:
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, *labelvalues, value: float) -> None:
+        with self._lock:
+            self._values[labelvalues] = value
+
+
+class Histogram(Metric):
+    """
+    Counts observations into cumulative buckets, with their sum and count.
+
+    Args:
+        buckets (tuple[float, ...], optional): The bucket upper bounds, in
+            increasing order. Defaults to `DEFAULT_BUCKETS`, in seconds.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self._series: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, *labelvalues) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labelvalues, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                labels = _format_labels(
+                    self.labelnames, labelvalues, f'le="{_format_value(bound)}"'
+                )
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum{labels} {_format_value(values[-1])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+def register_collector(collector: Callable[[], None]) -> None:
+    """
+    Registers a function called before each render, to refresh gauges that mirror
+    state kept elsewhere.
+    """
+    _collectors.append(collector)
+
+
+def render() -> str:
+    """
+    Returns every metric in the Prometheus text exposition format.
+    """
+    for collector in _collectors:
+        collector()
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests by method, route template and status code.",
+    ("method", "route", "status"),
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by method and route template.",
+    ("method", "route"),
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being served, by method.",
+    ("method",),
+)
+HTTP_REQUEST_DB_STATEMENTS = Histogram(
+    "http_request_db_statements",
+    "SQL statements run per HTTP request, by route template.",
+    ("route",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50),
+)
+HTTP_REQUEST_DB_DURATION = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent running SQL statements per HTTP request, by route template.",
+    ("route",),
+)
+DB_STATEMENT_DURATION = Histogram(
+    "db_statement_duration_seconds",
+    "SQL statement execution time, by statement type.",
+    ("statement",),
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection, including opening new ones.",
+    ("pool",),
+)
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds",
+    "Password hash and verify time, including the wait for a worker.",
+    ("operation",),
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total",
+    "Password operations rejected because the worker queue was full.",
+)
+LOGIN_THROTTLED = Counter(
+    "login_throttled_total",
+    "Login attempts rejected by the rate limiter, by the limit hit.",
+    ("limit",),
+)
+JWT_DURATION = Histogram(
+    "jwt_duration_seconds",
+    "JWT encode and decode time.",
+    ("operation",),
+)
+CACHE_HITS = Gauge("cache_hits", "Cache hits since startup, by cache.", ("cache",))
+CACHE_MISSES = Gauge(
+    "cache_misses", "Cache misses since startup, by cache.", ("cache",)
+)
+CACHE_EVICTIONS = Gauge(
+    "cache_evictions", "Entries evicted to stay under the size limit.", ("cache",)
+)
+CACHE_ENTRIES = Gauge("cache_entries", "Entries currently cached.", ("cache",))
+
+
+def register_cache(name: str, cache) -> None:
+    """
+    Mirrors a cache's `stats()` into the cache gauges on each render.
+
+    Args:
+        name (str): The value of the "cache" label.
+        cache (TTLCache): The cache to report.
+    """
+
+    def collect() -> None:
+        stats = cache.stats()
+        CACHE_HITS.set(name, value=stats["hits"])
+        CACHE_MISSES.set(name, value=stats["misses"])
+        CACHE_EVICTIONS.set(name, value=stats["evictions"])
+        CACHE_ENTRIES.set(name, value=stats["size"])
+
+    register_collector(collect)
@@ -1,4 +1,5 @@
 from ..database import Base
 from .settings import Settings
 from .user import User
-from .meal_plan import Meal, MealPlan
+from .meal_plan import Meal, MealPlan, MealPlanWeekSummary, mealplan_snacks
+from .revoked_token import RevokedToken
@@ -1,4 +1,18 @@
-from sqlalchemy import Column, Integer, String
+from datetime import datetime
+
+from sqlalchemy import (
+    DDL,
+    Column,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Table,
+    event,
+)
+from sqlalchemy.orm import relationship
 
 from ..database import Base
 
@@ -13,14 +27,131 @@ class Meal(Base):
     user_id = Column(Integer, index=True)
 
 
+# Meal search indexes, created with the meals table. On SQLite, an external-content
+# FTS5 table kept in sync by triggers; the owner is indexed as a column so that
+# searches filter on it inside the index, and prefixes of up to 7 characters
+# are indexed so that prefix queries don't merge the doclists of every matching
+# word. The type is left unindexed: searches check it on the meals rows. Rebuilding the meals table (e.g. in a batch migration) drops the triggers,
+# which must then be recreated.
+MEALS_FTS_DDL = (
+    """
+    CREATE VIRTUAL TABLE meals_fts USING fts5(
+        name, description, meal_type UNINDEXED, user_id,
+        content='meals', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3 4 5 6 7'
+    )
+    """,
+    """
+    CREATE TRIGGER meals_fts_insert AFTER INSERT ON meals BEGIN
+        INSERT INTO meals_fts (rowid, name, description, meal_type, user_id)
+        VALUES (new.id, new.name, new.description, new.meal_type, new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER meals_fts_delete AFTER DELETE ON meals BEGIN
+        INSERT INTO meals_fts (meals_fts, rowid, name, description, meal_type, user_id)
+        VALUES ('delete', old.id, old.name, old.description, old.meal_type, old.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER meals_fts_update AFTER UPDATE ON meals BEGIN
+        INSERT INTO meals_fts (meals_fts, rowid, name, description, meal_type, user_id)
+        VALUES ('delete', old.id, old.name, old.description, old.meal_type, old.user_id);
+        INSERT INTO meals_fts (rowid, name, description, meal_type, user_id)
+        VALUES (new.id, new.name, new.description, new.meal_type, new.user_id);
+    END
+    """,
+)
+# On PostgreSQL, a GIN index on the same expression `crud.search_meals` queries.
+MEALS_SEARCH_DOCUMENT = (
+    "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(description, ''))"
+)
+MEALS_SEARCH_INDEX_DDL = (
+    f"CREATE INDEX ix_meals_search ON meals USING gin ({MEALS_SEARCH_DOCUMENT})"
+)
+
+for statement in MEALS_FTS_DDL:
+    event.listen(
+        Meal.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite")
+    )
+event.listen(
+    Meal.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS meals_fts").execute_if(dialect="sqlite"),
+)
+event.listen(
+    Meal.__table__,
+    "after_create",
+    DDL(MEALS_SEARCH_INDEX_DDL).execute_if(dialect="postgresql"),
+)
+
+
+mealplan_snacks = Table(
+    "mealplan_snacks",
+    Base.metadata,
+    Column(
+        "mealplan_id",
+        Integer,
+        ForeignKey("mealplans.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    Column(
+        "meal_id",
+        Integer,
+        ForeignKey("meals.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    ),
+)
+
+
 class MealPlan(Base):
     __tablename__ = "mealplans"
+    __table_args__ = (
+        Index("ix_mealplans_user_id_date", "user_id", "date", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(String)
+    date = Column(Date)
     meal_type = Column(String)
-    breakfast = Column(Integer, nullable=True)
-    lunch = Column(Integer, nullable=True)
-    dinner = Column(Integer, nullable=True)
-    snacks = Column(String, nullable=True)
-    user_id = Column(Integer, index=True)
+    breakfast_id = Column(Integer, ForeignKey("meals.id"), nullable=True)
+    lunch_id = Column(Integer, ForeignKey("meals.id"), nullable=True)
+    dinner_id = Column(Integer, ForeignKey("meals.id"), nullable=True)
+    user_id = Column(Integer)
+    # Drives the meal plans' ETag; bumped on every update of the row or its snacks.
+    updated_at = Column(
+        DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+    breakfast = relationship("Meal", foreign_keys=[breakfast_id])
+    lunch = relationship("Meal", foreign_keys=[lunch_id])
+    dinner = relationship("Meal", foreign_keys=[dinner_id])
+    snacks = relationship("Meal", secondary=mealplan_snacks, order_by=Meal.id)
+
+
+@event.listens_for(MealPlan.snacks, "append")
+@event.listens_for(MealPlan.snacks, "remove")
+def _touch_meal_plan(target, value, initiator) -> None:
+    # Snacks live in the association table, which doesn't trigger `onupdate`.
+    target.updated_at = datetime.utcnow()
+
+
+class MealPlanWeekSummary(Base):
+    """
+    The totals of a user's meal plans over one week, starting on a Monday.
+
+    Recomputed by `crud.refresh_meal_plan_week_summaries` for the weeks each write
+    touches, so summaries are read from one row per week instead of aggregating
+    the plans.
+    """
+
+    __tablename__ = "mealplan_week_summaries"
+
+    user_id = Column(Integer, primary_key=True)
+    week_start = Column(Date, primary_key=True)
+    days_planned = Column(Integer, nullable=False, default=0)
+    breakfasts = Column(Integer, nullable=False, default=0)
+    lunches = Column(Integer, nullable=False, default=0)
+    dinners = Column(Integer, nullable=False, default=0)
+    snacks = Column(Integer, nullable=False, default=0)
+    distinct_meals = Column(Integer, nullable=False, default=0)
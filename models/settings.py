@@ -10,5 +10,7 @@ class Settings(Base):
     id = Column(Integer, ForeignKey("users.id"), primary_key=True, index=True)
     theme_mode = Column(String, default="system")
     theme_color = Column(String, default="lime")
+    # Incremented on every change; the settings' ETag.
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     user = relationship("User", back_populates="settings")
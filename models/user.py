@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean
+from sqlalchemy import Column, Integer, String, Boolean, Index, false
 from sqlalchemy.orm import relationship
 
 from ..database import Base
@@ -13,5 +13,11 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
+    is_admin = Column(Boolean, nullable=False, default=False, server_default=false())
 
     settings = relationship("Settings", back_populates="user")
+
+    __table_args__ = (
+        # Pages of the user listing filtered on `is_active`, in id order.
+        Index("ix_users_is_active_id", "is_active", "id"),
+    )
@@ -0,0 +1,290 @@
+"""
+Token bucket rate limiting.
+
+Each key (a username, a client address) has a bucket of `burst` tokens refilled at
+`rate` tokens per second; a request takes a token or is rejected with the time
+until one is available. A bucket is stored as the single time at which it will be
+full again, so idle keys need no refill work and can be dropped once that time has
+passed.
+
+`TokenBucketLimiter` keeps the buckets in the process; `SQLiteLimiter` keeps them in
+a SQLite file that every worker process on the host shares. Both implement
+`RateLimiter`, and `make_limiter` picks one from configuration. From async code, go
+through `call_limiter`, which keeps the file I/O of `SQLiteLimiter` off the event
+loop.
+"""
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Protocol
+
+from starlette.concurrency import run_in_threadpool
+
+
+class RateLimiter(Protocol):
+    """
+    The interface of the rate limiter backends.
+
+    `blocking` tells whether the operations do I/O that may wait, e.g. on a lock
+    held by another process.
+    """
+
+    blocking: bool
+
+    def acquire(self, key: str) -> float:
+        ...
+
+    def reset(self, key: str) -> None:
+        ...
+
+
+def _take(full_at: float, now: float, interval: float, burst: int):
+    """
+    Takes a token from a bucket that will be full at `full_at`.
+
+    Returns:
+        tuple[float, float]: The bucket's new "full at" time and 0 if a token was
+            available, else the unchanged time and the seconds until one is.
+    """
+    earliest = max(full_at, now) + interval - burst * interval
+    if earliest > now:
+        return full_at, earliest - now
+    return max(full_at, now) + interval, 0.0
+
+
+class TokenBucketLimiter:
+    """
+    A thread-safe token bucket per key, kept in the process.
+
+    At most `maxsize` buckets are kept; past that the least recently used one is
+    dropped, which refills it.
+
+    Args:
+        rate (float): Tokens added per second.
+        burst (int): The bucket size: requests allowed at once after a quiet period.
+        maxsize (int): The maximum number of buckets.
+        timer (Callable[[], float], optional): The clock. Defaults to
+            `time.monotonic`.
+    """
+
+    blocking = False
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        maxsize: int,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.interval = 1 / rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self.timer = timer
+        # key -> the time the bucket will be full again.
+        self._buckets: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str) -> float:
+        """
+        Takes a token from the key's bucket.
+
+        Returns:
+            float: 0 if the request is allowed, else the seconds until it would be.
+        """
+        now = self.timer()
+        with self._lock:
+            full_at, wait = _take(
+                self._buckets.get(key, now), now, self.interval, self.burst
+            )
+            if wait:
+                return wait
+            self._buckets[key] = full_at
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return 0.0
+
+    def reset(self, key: str) -> None:
+        """
+        Refills the key's bucket.
+        """
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SQLiteLimiter:
+    """
+    A token bucket per key, stored in a SQLite file so that the worker processes of
+    a deployment share it.
+
+    Full buckets are purged every `purge_every` requests, then the ones closest to
+    full past `maxsize`. Limiters sharing a file need different tables, so that
+    each counts and evicts only its own buckets.
+
+    Args:
+        path (str): The SQLite database file; created if missing.
+        rate (float): Tokens added per second.
+        burst (int): The bucket size.
+        maxsize (int): The maximum number of buckets.
+        table (str, optional): The table holding the buckets; created if missing.
+            Defaults to "buckets".
+        timer (Callable[[], float], optional): The clock, which must agree across
+            processes. Defaults to `time.time`.
+        purge_every (int, optional): The number of requests between purges.
+            Defaults to 256.
+    """
+
+    blocking = True
+
+    def __init__(
+        self,
+        path: str,
+        rate: float,
+        burst: int,
+        maxsize: int,
+        table: str = "buckets",
+        timer: Callable[[], float] = time.time,
+        purge_every: int = 256,
+    ):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name {table!r}")
+        self.path = path
+        self.table = table
+        self.interval = 1 / rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self.timer = timer
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._connection().execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, full_at REAL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads; keep one per thread.
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, isolation_level=None)
+            connection.execute("PRAGMA busy_timeout=5000")
+            connection.execute("PRAGMA journal_mode=WAL")
+            # Losing the buckets in a power failure is harmless.
+            connection.execute("PRAGMA synchronous=OFF")
+            self._local.connection = connection
+        return connection
+
+    def acquire(self, key: str) -> float:
+        """
+        Takes a token from the key's bucket.
+
+        Returns:
+            float: 0 if the request is allowed, else the seconds until it would be.
+        """
+        connection = self._connection()
+        now = self.timer()
+        # IMMEDIATE takes the write lock up front, so that two workers can't both
+        # read the bucket and take the same token.
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                f"SELECT full_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            full_at, wait = _take(
+                now if row is None else row[0], now, self.interval, self.burst
+            )
+            if not wait:
+                connection.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, full_at) VALUES (?, ?)",
+                    (key, full_at),
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        with self._lock:
+            self._requests += 1
+            purge = self._requests % self.purge_every == 0
+        if purge:
+            self._purge(connection)
+        return wait
+
+    def _purge(self, connection: sqlite3.Connection) -> None:
+        connection.execute(
+            f"DELETE FROM {self.table} WHERE full_at <= ?", (self.timer(),)
+        )
+        connection.execute(
+            f"""
+            DELETE FROM {self.table} WHERE key IN (
+                SELECT key FROM {self.table} ORDER BY full_at
+                LIMIT max((SELECT count(*) FROM {self.table}) - ?, 0)
+            )
+            """,
+            (self.maxsize,),
+        )
+
+    def reset(self, key: str) -> None:
+        """
+        Refills the key's bucket.
+        """
+        self._connection().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def __len__(self) -> int:
+        return (
+            self._connection()
+            .execute(f"SELECT count(*) FROM {self.table}")
+            .fetchone()[0]
+        )
+
+
+async def call_limiter(limiter: RateLimiter, fn: Callable, /, *args) -> Any:
+    """
+    Calls one of the limiter's methods from async code: in the threadpool if the
+    limiter is blocking, else directly.
+
+    Args:
+        limiter (RateLimiter): The limiter.
+        fn (Callable): The method, e.g. `limiter.acquire`.
+
+    Returns:
+        Any: The return value of the method.
+    """
+    if limiter.blocking:
+        return await run_in_threadpool(fn, *args)
+    return fn(*args)
+
+
+def make_limiter(
+    backend: str, rate: float, burst: int, maxsize: int, path: str, name: str
+) -> RateLimiter:
+    """
+    Returns a rate limiter using the named backend.
+
+    Args:
+        backend (str): "memory" for a per-process `TokenBucketLimiter`, or "sqlite"
+            for a `SQLiteLimiter` shared by the processes using the same file.
+        rate (float): Tokens added per second.
+        burst (int): The bucket size.
+        maxsize (int): The maximum number of buckets.
+        path (str): The file of the "sqlite" backend.
+        name (str): The limiter's name, unique among those sharing the file; the
+            "sqlite" backend keeps its buckets in the table of that name.
+
+    Returns:
+        RateLimiter: The limiter.
+
+    Raises:
+        ValueError: If the backend is unknown, or the name isn't an identifier.
+    """
+    if backend == "memory":
+        return TokenBucketLimiter(rate=rate, burst=burst, maxsize=maxsize)
+    if backend == "sqlite":
+        return SQLiteLimiter(
+            path, rate=rate, burst=burst, maxsize=maxsize, table=f"{name}_buckets"
+        )
+    raise ValueError(f"Unknown limiter backend {backend!r}; use 'memory' or 'sqlite'")
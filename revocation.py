@@ -0,0 +1,146 @@
+"""
+In-memory list of revoked access tokens.
+
+`get_current_user` checks every token's `jti` against `revoked_tokens`, a set held in
+the process, so revocation costs no query per request. Revocations are persisted in
+the `revoked_tokens` table: each process loads the unexpired ones at startup and
+polls the table for newer rows every `REVOCATION_REFRESH_SECONDS`, which bounds how
+long a token revoked through another worker stays usable there.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Callable, Iterable
+
+from . import crud
+from .database import get_async_db
+from .metrics import Gauge, register_collector
+
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "5"))
+# Rows are polled by increasing ID, but on PostgreSQL a transaction can commit after
+# one holding a later ID; re-reading the most recent IDs catches those stragglers.
+REVOCATION_REFRESH_OVERLAP = 100
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationList:
+    """
+    A thread-safe set of revoked token IDs that forgets each ID once its token
+    has expired.
+
+    Expired tokens already fail signature validation, so entries only need to live
+    as long as their token; they are purged as new ones are added.
+
+    Args:
+        timer (Callable[[], float], optional): The clock the expiry times are
+            compared to, in seconds since the epoch. Defaults to `time.time`.
+    """
+
+    def __init__(self, timer: Callable[[], float] = time.time):
+        self.timer = timer
+        self._revoked: set[str] = set()
+        # (expires, jti), soonest expiry first.
+        self._expiries: list[tuple[float, str]] = []
+        self._lock = threading.Lock()
+        # The ID of the last `revoked_tokens` row read.
+        self.last_id = 0
+
+    def __contains__(self, jti: str) -> bool:
+        return jti in self._revoked
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def add(self, jti: str, expires: float) -> None:
+        """
+        Revokes the token ID until its expiry.
+
+        Args:
+            jti (str): The token's `jti` claim.
+            expires (float): The token's expiry, in seconds since the epoch.
+        """
+        self.update([(jti, expires)])
+
+    def update(self, entries: Iterable[tuple[str, float]]) -> None:
+        """
+        Revokes each token ID until its expiry, then purges the expired ones.
+
+        Args:
+            entries (Iterable[tuple[str, float]]): The `jti` and expiry pairs.
+        """
+        with self._lock:
+            for jti, expires in entries:
+                if jti not in self._revoked:
+                    self._revoked.add(jti)
+                    heapq.heappush(self._expiries, (expires, jti))
+            self._purge()
+
+    def _purge(self) -> None:
+        now = self.timer()
+        while self._expiries and self._expiries[0][0] <= now:
+            _, jti = heapq.heappop(self._expiries)
+            self._revoked.discard(jti)
+
+
+revoked_tokens = RevocationList()
+
+REVOKED_TOKENS = Gauge(
+    "revoked_tokens", "Unexpired revoked tokens held in memory by the process."
+)
+register_collector(lambda: REVOKED_TOKENS.set(value=len(revoked_tokens)))
+
+
+def utc_timestamp(value: datetime) -> float:
+    """
+    Returns the naive UTC datetime as seconds since the epoch.
+    """
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+async def load_revoked_tokens(db) -> int:
+    """
+    Adds the revocations recorded since the last call to `revoked_tokens`.
+
+    Args:
+        db (Session | AsyncSession): The database session.
+
+    Returns:
+        int: The number of rows read.
+    """
+    after_id = max(revoked_tokens.last_id - REVOCATION_REFRESH_OVERLAP, 0)
+    rows = await crud.aio.get_revoked_tokens(db, after_id=after_id)
+    revoked_tokens.update((jti, utc_timestamp(expires)) for _, jti, expires in rows)
+    if rows:
+        revoked_tokens.last_id = max(revoked_tokens.last_id, rows[-1][0])
+    return len(rows)
+
+
+async def start_revocation_refresh() -> asyncio.Task:
+    """
+    Deletes the expired revocations, loads the others, then starts a task that
+    polls for new ones every `REVOCATION_REFRESH_SECONDS`.
+
+    Returns:
+        asyncio.Task: The polling task; cancel it on shutdown.
+    """
+    session = asynccontextmanager(get_async_db)
+    async with session() as db:
+        await crud.aio.delete_expired_revoked_tokens(db)
+        await load_revoked_tokens(db)
+
+    async def refresh() -> None:
+        while True:
+            await asyncio.sleep(REVOCATION_REFRESH_SECONDS)
+            try:
+                async with session() as db:
+                    await load_revoked_tokens(db)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Could not refresh the revoked tokens")
+
+    return asyncio.create_task(refresh())
@@ -4,7 +4,6 @@ from typing import Annotated
 from fastapi import APIRouter, Body, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import EmailStr
-from sqlalchemy.orm import Session
 
 from .. import crud
 from ..schemas import UserCreate
@@ -13,17 +12,43 @@ from ..auth import (
     Token,
     authenticate_user,
     create_access_token,
-    get_password_hash,
+    get_token_payload,
+    reset_login_throttle,
+    throttle_login,
 )
-from ..database import get_db
+from ..database import DBSession, get_async_db, record_write
+from ..hashing import password_hasher
+from ..revocation import revoked_tokens
 
 router = APIRouter(tags=["authentication"])
 
 
-@router.post("/login", response_model=Token)
+def issue_access_token(username: str) -> Token:
+    """
+    Returns a new access token for the user.
+
+    Args:
+        username (str): The username of the authenticated user.
+
+    Returns:
+        Token: The access token.
+    """
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": username}, expires_delta=access_token_expires
+    )
+
+    return Token(
+        access_token=access_token,
+        token_type="bearer",
+        expires=datetime.today() + access_token_expires,
+    )
+
+
+@router.post("/login", response_model=Token, dependencies=[Depends(throttle_login)])
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[DBSession, Depends(get_async_db)],
 ) -> Token:
     """
     Returns an access token.
@@ -37,24 +62,42 @@ async def login_for_access_token(
     Raises:
         HTTPException: If the user is not authenticated.
     """
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    await reset_login_throttle(form_data.username)
+    return issue_access_token(user.username)
 
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
 
-    return Token(
-        access_token=access_token,
-        token_type="bearer",
-        expires=datetime.today() + access_token_expires,
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    payload: Annotated[dict, Depends(get_token_payload)],
+    db: Annotated[DBSession, Depends(get_async_db)],
+) -> None:
+    """
+    Revokes the access token the request was made with.
+
+    Args:
+        payload (dict): The claims of the access token.
+
+    Raises:
+        HTTPException: If the token predates revocation support and has no ID.
+    """
+    jti = payload.get("jti")
+    if jti is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="This token cannot be revoked; it expires on its own",
+        )
+
+    await crud.aio.revoke_token(
+        db, jti=jti, expires_at=datetime.utcfromtimestamp(payload["exp"])
     )
+    revoked_tokens.add(jti, payload["exp"])
 
 
 class OAuth2SignupForm(OAuth2PasswordRequestForm):
@@ -62,15 +105,15 @@ class OAuth2SignupForm(OAuth2PasswordRequestForm):
     full_name: str | None = None
 
 
-@router.post("/signup", response_model=Token)
+@router.post("/signup", response_model=Token, dependencies=[Depends(throttle_login)])
 async def signup_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[DBSession, Depends(get_async_db)],
     email: Annotated[EmailStr, Body()],
     full_name: Annotated[str | None, Body()] = None,
 ) -> Token:
     """
-    Returns an access token.
+    Creates a user and returns an access token for them.
 
     Args:
         form_data (dict[str, str]): The form data.
@@ -79,16 +122,27 @@ async def signup_for_access_token(
         Token: The access token.
 
     Raises:
-        HTTPException: If the user is not authenticated.
+        HTTPException: If the username or email is already registered.
     """
-    hashed_password = get_password_hash(form_data.password)
-    crud.create_user(
-        db,
-        UserCreate(
-            username=form_data.username,
-            email=email,
-            full_name=full_name,
-            hashed_password=hashed_password,
-        ),
-    )
-    return await login_for_access_token(form_data, db)
+    hashed_password = await password_hasher.hash(form_data.password)
+    try:
+        user = await crud.aio.create_user(
+            db,
+            UserCreate(
+                username=form_data.username,
+                email=email,
+                full_name=full_name,
+                hashed_password=hashed_password,
+            ),
+        )
+    except crud.DuplicateUserError as error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{error.field.capitalize()} already registered",
+        )
+    # The request had no token to attribute the write to; keep the new user's first
+    # reads on the primary, which has their row.
+    await record_write(user.username)
+    # The password was just hashed; verifying it again would only cost another
+    # bcrypt round.
+    return issue_access_token(user.username)
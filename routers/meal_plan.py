@@ -1,28 +1,209 @@
+import csv
+import io
 from datetime import datetime
-from fastapi import APIRouter, Depends
+from typing import Annotated, AsyncIterator, Literal
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 from ..schemas import User
 from ..auth import get_current_active_user
-from ..database import get_db
+from ..database import get_async_db
+from ..etags import etag_matches, make_etag, not_modified, set_etag
+from ..serialization import adapter_response
 from .. import schemas
 from .. import crud
 
 
 router = APIRouter(tags=["Food", "Meal Plan"], prefix="/mealplans")
 
+meal_plans_adapter = TypeAdapter(list[schemas.MealPlan])
+meal_plan_adapter = TypeAdapter(schemas.MealPlan)
+
+# The most items accepted by one bulk request.
+MAX_BULK_ITEMS = 10000
+# The most periods returned by one summary request: five years of weeks.
+MAX_SUMMARY_PERIODS = 262
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+CSV_COLUMNS = ("id", "date", "meal_type", "breakfast", "lunch", "dinner", "snacks")
+
 
 @router.get("/", response_model=list[schemas.MealPlan])
 async def get_meal_plans(
+    request: Request,
     start_date: datetime,
     end_date: datetime,
     current_user: User = Depends(get_current_active_user),
-    db=Depends(get_db),
+    db=Depends(get_async_db),
 ):
     """
     Returns a list of meal plans.
 
+    The response carries an ETag derived from the plans' count and latest update;
+    a request whose `If-None-Match` matches it gets a 304 without loading the plans.
+
     Returns:
         list: A list of meal plans.
     """
-    return crud.get_meal_plans(
-        db, current_user.id, start_date=start_date, end_date=end_date
+    start, end = start_date.date(), end_date.date()
+    if "if-none-match" in request.headers:
+        count, updated_at = await crud.aio.get_meal_plans_version(
+            db, current_user.id, start_date=start, end_date=end
+        )
+        etag = make_etag("mealplans", current_user.id, count, updated_at)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+    meal_plans = await crud.aio.get_meal_plans(
+        db, current_user.id, start_date=start, end_date=end
+    )
+    updated_at = max((plan.updated_at for plan in meal_plans), default=None)
+    response = adapter_response(meal_plans_adapter, meal_plans)
+    set_etag(
+        response, make_etag("mealplans", current_user.id, len(meal_plans), updated_at)
+    )
+    return response
+
+
+@router.get("/summary")
+async def get_meal_plan_summaries(
+    start_date: datetime,
+    end_date: datetime,
+    period: schemas.SummaryPeriod = schemas.SummaryPeriod.WEEK,
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_async_db),
+) -> list[schemas.MealPlanSummary]:
+    """
+    Returns the totals of the user's meal plans per week or month: the planned
+    days and gaps, the meals in each slot and the distinct meals.
+
+    Every period overlapping the range is returned whole, including those without
+    plans. Weeks start on Monday and are read from the summaries kept up to date
+    by meal plan writes; months are totalled by the database.
+
+    Args:
+        start_date (datetime): A day of the first period.
+        end_date (datetime): A day of the last period.
+        period (SummaryPeriod): "week" or "month". Defaults to "week".
+
+    Returns:
+        list[MealPlanSummary]: The summary of each period, in order.
+
+    Raises:
+        HTTPException: 422 if the range spans more than `MAX_SUMMARY_PERIODS`
+            periods, or its last period ends past `date.max`.
+    """
+    start, end = start_date.date(), end_date.date()
+    try:
+        periods = crud.count_summary_periods(start, end, period)
+    except OverflowError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="The range reaches past the last supported period",
+        )
+    if periods > MAX_SUMMARY_PERIODS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"The range spans more than {MAX_SUMMARY_PERIODS} periods",
+        )
+    return await crud.aio.get_meal_plan_summaries(
+        db, current_user.id, start_date=start, end_date=end, period=period
+    )
+
+
+async def _ndjson_lines(batches: AsyncIterator) -> AsyncIterator[bytes]:
+    async for batch in batches:
+        yield b"".join(
+            meal_plan_adapter.dump_json(
+                meal_plan_adapter.validate_python(plan, from_attributes=True)
+            )
+            + b"\n"
+            for plan in batch
+        )
+
+
+async def _csv_lines(batches: AsyncIterator) -> AsyncIterator[str]:
+    def name(meal) -> str:
+        return meal.name if meal is not None else ""
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    async for batch in batches:
+        writer.writerows(
+            (
+                plan.id,
+                plan.date.isoformat(),
+                plan.meal_type,
+                name(plan.breakfast),
+                name(plan.lunch),
+                name(plan.dinner),
+                "; ".join(snack.name for snack in plan.snacks),
+            )
+            for plan in batch
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+@router.get("/export")
+async def export_meal_plans(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_async_db),
+):
+    """
+    Streams the user's meal plans, oldest first, as newline-delimited JSON (one
+    `MealPlan` per line) or CSV with the meals' names.
+
+    Plans are fetched in batches with a server-side cursor and written out as they
+    arrive, so memory use doesn't depend on the range.
+
+    Args:
+        format (str): "ndjson" or "csv".
+        start_date (datetime | None): The first day to export. Defaults to the first
+            plan.
+        end_date (datetime | None): The last day to export. Defaults to the last
+            plan.
+
+    Returns:
+        StreamingResponse: The meal plans.
+    """
+    batches = crud.aio.iter_meal_plans(
+        db,
+        current_user.id,
+        start_date=start_date.date() if start_date else None,
+        end_date=end_date.date() if end_date else None,
+    )
+    lines = _ndjson_lines(batches) if format == "ndjson" else _csv_lines(batches)
+    return StreamingResponse(
+        lines,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="mealplans.{format}"'},
     )
+
+
+@router.post("/bulk")
+async def import_meal_plans(
+    plans: Annotated[list[schemas.MealPlanImport], Body(max_length=MAX_BULK_ITEMS)],
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_async_db),
+) -> schemas.BulkResult:
+    """
+    Creates or replaces meal plans in bulk, one per date.
+
+    A plan replaces the user's existing plan for its date. Plans referring to
+    unknown meals, or followed by another plan for the same date, are rejected and
+    reported; the others are written in a single transaction.
+
+    Args:
+        plans (list[MealPlanImport]): The plans, at most `MAX_BULK_ITEMS`.
+
+    Returns:
+        BulkResult: The outcome of each plan, in the order given.
+    """
+    return await crud.aio.upsert_meal_plans(db, current_user.id, plans)
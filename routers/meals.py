@@ -0,0 +1,56 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Body, Depends, Query
+
+from .. import crud, schemas
+from ..auth import get_current_active_user
+from ..database import get_async_db
+from ..schemas import User
+from .meal_plan import MAX_BULK_ITEMS
+
+router = APIRouter(tags=["Food"], prefix="/meals")
+
+
+@router.post("/bulk")
+async def create_meals(
+    meals: Annotated[list[schemas.MealCreate], Body(max_length=MAX_BULK_ITEMS)],
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_async_db),
+) -> schemas.BulkResult:
+    """
+    Creates meals in bulk, in a single transaction.
+
+    Args:
+        meals (list[MealCreate]): The meals, at most `MAX_BULK_ITEMS`.
+
+    Returns:
+        BulkResult: The ID of each created meal, in the order given.
+    """
+    return await crud.aio.create_meals(db, current_user.id, meals)
+
+
+@router.get("/search")
+async def search_meals(
+    q: Annotated[str, Query(max_length=200)],
+    meal_type: schemas.MealType | None = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_async_db),
+) -> list[schemas.Meal]:
+    """
+    Searches the user's meals by name and description, best matches first.
+
+    Each word of the query matches words starting with it, so the endpoint can
+    back an autocompleting search box.
+
+    Args:
+        q (str): The search text.
+        meal_type (MealType | None): Only return meals of this type.
+        limit (int): The maximum number of meals, from 1 to 100. Defaults to 20.
+
+    Returns:
+        list[Meal]: The matching meals.
+    """
+    return await crud.aio.search_meals(
+        db, current_user.id, q, meal_type=meal_type, limit=limit
+    )
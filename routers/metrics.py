@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from .. import metrics
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """
+    Returns the process's metrics in the Prometheus text format.
+
+    A sync route, so that FastAPI runs it in the threadpool: the collectors of the
+    "sqlite" caches query their files.
+
+    Returns:
+        PlainTextResponse: The rendered metrics.
+    """
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
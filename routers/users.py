@@ -1,37 +1,67 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 
 from .. import crud
-from ..auth import get_current_active_user
-from ..database import get_db
-from ..schemas import Setting, Settings, User, UserCreate
+from ..auth import get_current_active_user, get_current_admin_user
+from ..database import DBSession, get_async_db
+from ..etags import etag_matches, make_etag, not_modified, set_etag
+from ..schemas import Setting, Settings, User, UserCreate, UserPage
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+MAX_USERS_PAGE_SIZE = 1000
+
 
-# todo: make admin only
 @router.get("/")
-async def get_users():
+async def get_users(
+    admin: Annotated[User, Depends(get_current_admin_user)],
+    db: Annotated[DBSession, Depends(get_async_db)],
+    cursor: int | None = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_USERS_PAGE_SIZE)] = 100,
+    is_active: bool | None = None,
+    username_prefix: Annotated[str | None, Query(min_length=1)] = None,
+) -> UserPage:
     """
-    Returns a list of users.
+    Returns a page of users in ID order. Administrators only.
+
+    Args:
+        cursor (int | None, optional): The `next_cursor` of the previous page.
+            Defaults to the first page.
+        limit (int, optional): The maximum number of users. Defaults to 100.
+        is_active (bool | None, optional): Only list active, or inactive, users.
+        username_prefix (str | None, optional): Only list usernames starting with
+            this, case-sensitively.
 
     Returns:
-        list: A list of users.
-    """
-    return [{"username": "Rick"}, {"username": "Morty"}]
+        UserPage: The users, the cursor of the next page and the estimated total.
+    """
+    # One extra row tells whether there is a next page.
+    users = await crud.aio.get_users(
+        db,
+        after_id=cursor,
+        limit=limit + 1,
+        is_active=is_active,
+        username_prefix=username_prefix,
+    )
+    next_cursor = users[limit - 1].id if len(users) > limit else None
+    return UserPage(
+        items=users[:limit],
+        next_cursor=next_cursor,
+        total_estimate=await crud.aio.get_user_count_estimate(db),
+    )
 
 
 @router.post("/users/", response_model=User)
-async def create_user(user: UserCreate, db: Annotated[Session, Depends(get_db)]):
-    db_user = crud.get_user_by_email(db, email=user.email)
-    if db_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    db_user = crud.get_user_by_username(db, username=user.username)
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    return crud.create_user(db=db, user=user)
+async def create_user(
+    user: UserCreate, db: Annotated[DBSession, Depends(get_async_db)]
+):
+    try:
+        return await crud.aio.create_user(db=db, user=user)
+    except crud.DuplicateUserError as error:
+        raise HTTPException(
+            status_code=400, detail=f"{error.field.capitalize()} already registered"
+        )
 
 
 @router.get("/me")
@@ -52,22 +82,32 @@ async def get_user_me(
 
 @router.get("/me/settings", tags=["settings"])
 async def get_user_settings(
+    request: Request,
+    response: Response,
     current_user: Annotated[User, Depends(get_current_active_user)],
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[DBSession, Depends(get_async_db)],
 ) -> Settings:
     """
     Returns the current authenticated user's settings.
 
+    The response carries an ETag; a request whose `If-None-Match` matches it gets
+    a 304 after a version lookup, without loading the settings.
+
     Args:
         current_user (User): The current authenticated user.
 
     Returns:
         User: The current authenticated user's settings.
     """
-    settings = crud.get_user_settings(current_user.id, db)
-    print("Router:", settings.id, settings.theme_mode)
-    if not settings:
-        settings = crud.create_user_settings(db, current_user.id)
+    if "if-none-match" in request.headers:
+        version = await crud.aio.get_user_settings_version(current_user.id, db)
+        if version is not None:
+            etag = make_etag("settings", current_user.id, version)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
+    settings = await crud.aio.get_user_settings(current_user.id, db)
+    set_etag(response, make_etag("settings", current_user.id, settings.version))
     return settings
 
 
@@ -75,7 +115,7 @@ async def get_user_settings(
 async def get_user_setting_from_name(
     setting_name: str,
     current_user: Annotated[User, Depends(get_current_active_user)],
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[DBSession, Depends(get_async_db)],
 ) -> dict[str, int | str | bool]:
     """
     Returns the current authenticated user's settings.
@@ -86,7 +126,7 @@ async def get_user_setting_from_name(
     Returns:
         User: The current authenticated user's settings.
     """
-    settings = crud.get_user_settings(current_user.id, db)
+    settings = await crud.aio.get_user_settings(current_user.id, db)
     response = settings.model_dump(include={setting_name})
     if not response:
         raise HTTPException(status_code=404, detail="Setting does not exist")
@@ -97,7 +137,7 @@ async def get_user_setting_from_name(
 async def patch_user_setting(
     setting: Setting,
     current_user: Annotated[User, Depends(get_current_active_user)],
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[DBSession, Depends(get_async_db)],
 ) -> Setting:
     """
     Returns the current authenticated user's settings.
@@ -108,7 +148,7 @@ async def patch_user_setting(
     Returns:
         User: The current authenticated user's settings.
     """
-    response = crud.set_user_setting(
+    response = await crud.aio.set_user_setting(
         db=db,
         user_id=current_user.id,
         setting=setting,
@@ -118,26 +158,31 @@ async def patch_user_setting(
     return response
 
 
-def _set_setting_helper(
-    db: Session,
+async def _set_settings_helper(
+    db: DBSession,
     user_id: int,
-    setting: Setting,
-) -> Setting | None:
-    response = crud.set_user_setting(
+    settings: list[Setting],
+) -> Settings:
+    response = await crud.aio.set_user_settings(
         db=db,
         user_id=user_id,
-        setting=setting,
+        settings=settings,
     )
-    if not response:
-        raise HTTPException(status_code=404, detail=f"Setting {setting} does not exist")
-    return setting
+    if response is None:
+        unknown = [
+            setting.key
+            for setting in settings
+            if setting.key not in crud.settings.SETTING_KEYS
+        ]
+        raise HTTPException(status_code=404, detail=f"Settings {unknown} do not exist")
+    return response
 
 
 @router.patch("/me/settings/all", tags=["settings"])
 async def patch_all_user_settings(
     settings: Settings,
     current_user: Annotated[User, Depends(get_current_active_user)],
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[DBSession, Depends(get_async_db)],
 ) -> Settings:
     """
     Returns the current authenticated user's settings.
@@ -148,17 +193,21 @@ async def patch_all_user_settings(
     Returns:
         User: The current authenticated user's settings.
     """
-    for setting, value in settings.model_dump().items():
-        print(setting, value)
-        _set_setting_helper(db, current_user.id, Setting(key=setting, value=value))
-    return settings
+    return await _set_settings_helper(
+        db,
+        current_user.id,
+        [
+            Setting(key=setting, value=value)
+            for setting, value in settings.model_dump(exclude={"id"}).items()
+        ],
+    )
 
 
 @router.patch("/me/settings", tags=["settings"])
 async def patch_some_user_settings(
     settings: list[Setting],
     current_user: Annotated[User, Depends(get_current_active_user)],
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[DBSession, Depends(get_async_db)],
 ) -> Settings:
     """
     Returns the current authenticated user's settings.
@@ -169,9 +218,7 @@ async def patch_some_user_settings(
     Returns:
         User: The current authenticated user's settings.
     """
-    for setting in settings:
-        _set_setting_helper(db, current_user.id, setting)
-    return crud.get_user_settings(current_user.id, db)
+    return await _set_settings_helper(db, current_user.id, settings)
 
 
 # todo make admin only
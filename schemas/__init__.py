@@ -1,3 +1,15 @@
 from .settings import Settings, Setting
-from .users import User, UserCreate
-from .meal_plan import Meal, MealPlan, MealPlanCreate, MealCreate
+from .users import User, UserCreate, UserPage
+from .meal_plan import (
+    BulkItemResult,
+    BulkItemStatus,
+    BulkResult,
+    Meal,
+    MealCreate,
+    MealPlan,
+    MealPlanCreate,
+    MealPlanImport,
+    MealPlanSummary,
+    MealType,
+    SummaryPeriod,
+)
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date
 import enum
 from pydantic import BaseModel
 
@@ -29,7 +29,7 @@ class Meal(MealBase):
 
 
 class MealPlanBase(BaseModel):
-    date: datetime
+    date: date
     meal_type: MealType
     breakfast: Meal | None = None
     lunch: Meal | None = None
@@ -47,3 +47,56 @@ class MealPlan(MealPlanBase):
 
     class Config:
         from_attributes = True
+
+
+class MealPlanImport(BaseModel):
+    date: date
+    meal_type: MealType
+    breakfast_id: int | None = None
+    lunch_id: int | None = None
+    dinner_id: int | None = None
+    snack_ids: list[int] = []
+
+
+class BulkItemStatus(enum.Enum):
+    CREATED = "created"
+    UPDATED = "updated"
+    REJECTED = "rejected"
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    status: BulkItemStatus
+    id: int | None = None
+    detail: str | None = None
+
+
+class BulkResult(BaseModel):
+    created: int
+    updated: int
+    rejected: int
+    items: list[BulkItemResult]
+
+
+class SummaryPeriod(enum.Enum):
+    WEEK = "week"
+    MONTH = "month"
+
+
+class MealPlanSummary(BaseModel):
+    """
+    The totals of the meal plans over one period.
+
+    `gaps` counts the days of the period without a plan, and `distinct_meals` the
+    different meals planned in any slot.
+    """
+
+    start_date: date
+    end_date: date
+    days_planned: int
+    gaps: int
+    breakfasts: int
+    lunches: int
+    dinners: int
+    snacks: int
+    distinct_meals: int
@@ -14,6 +14,20 @@ class UserCreate(UserBase):
 class User(UserBase):
     id: int
     is_active: bool
+    is_admin: bool = False
 
     class Config:
         from_attributes = True
+
+
+class UserPage(BaseModel):
+    """
+    A page of the user listing.
+
+    `next_cursor` is passed as `cursor` to fetch the next page, and is None on the
+    last one. `total_estimate` approximates the number of users, ignoring filters.
+    """
+
+    items: list[User]
+    next_cursor: int | None
+    total_estimate: int
@@ -0,0 +1,33 @@
+"""
+Fast JSON serialization for large responses.
+
+FastAPI's `response_model` handling validates the returned objects into the model,
+then serializes them to Python objects, runs them through `jsonable_encoder` and
+finally encodes them. Routes returning large lists can opt out of that: build a
+`TypeAdapter` for the response type once at import and return
+`adapter_response(adapter, rows)`, which validates the ORM rows once and encodes
+them directly to JSON bytes in pydantic-core. Keep `response_model` on the route so
+the OpenAPI schema is unchanged.
+"""
+from typing import Any
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+def adapter_response(
+    adapter: TypeAdapter, value: Any, status_code: int = 200
+) -> Response:
+    """
+    Returns a JSON response of the value, validated against the adapter's type.
+
+    Args:
+        adapter (TypeAdapter): The adapter of the response type.
+        value (Any): The value to return, e.g. ORM objects.
+        status_code (int, optional): The response status. Defaults to 200.
+
+    Returns:
+        Response: The JSON response.
+    """
+    content = adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+    return Response(content, status_code=status_code, media_type="application/json")
@@ -0,0 +1,166 @@
+"""
+Production entry point: serves the API with uvicorn worker processes, e.g.:
+
+    python -m assistant_api.serve --workers 4 --port 8000
+
+Each worker builds its own application with `main.create_app`. uvloop and httptools
+are used when installed. On SIGTERM or SIGINT, workers stop accepting connections
+and let in-flight requests finish for up to `--graceful-shutdown-timeout` seconds.
+
+Several workers may share one SQLite file: it runs in WAL mode with a busy timeout
+(see `database.SQLITE_PRAGMAS`), tables are created once here rather than by every
+worker, and the settings cache and login limits move to the shared `sqlite`
+backends, so a change made through one worker is not served stale by another and
+login attempts are counted across workers. The users who wrote recently are
+shared the same way, so their reads stay on the primary whichever worker serves
+them (see `database.get_async_db`).
+"""
+import argparse
+import os
+
+import uvicorn
+from dotenv import load_dotenv
+
+PACKAGE = __package__
+
+
+def default_workers() -> int:
+    """
+    Returns `WEB_CONCURRENCY` if set, else the number of CPU cores.
+    """
+    return int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+
+
+def configure_workers(workers: int) -> None:
+    """
+    Sets the environment the worker processes start with, leaving any value that
+    is already set alone.
+
+    Args:
+        workers (int): The number of worker processes.
+    """
+    cores = os.cpu_count() or 1
+    # Each worker has its own password hashing pool; share the cores between them.
+    os.environ.setdefault("PASSWORD_HASH_WORKERS", str(max(cores // workers, 1)))
+    if workers > 1:
+        os.environ.setdefault("SETTINGS_CACHE_BACKEND", "sqlite")
+        os.environ.setdefault("LOGIN_RATE_LIMIT_BACKEND", "sqlite")
+        os.environ.setdefault("READ_YOUR_WRITES_BACKEND", "sqlite")
+
+
+def create_tables() -> None:
+    """
+    Creates the missing tables once, before the workers start, when
+    `DB_CREATE_ALL` is set; workers then skip it.
+    """
+    from .database import engine, env_flag
+    from . import models
+
+    if env_flag("DB_CREATE_ALL", False):
+        models.Base.metadata.create_all(bind=engine)
+        engine.dispose()
+    os.environ["DB_CREATE_ALL"] = "false"
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes. Defaults to WEB_CONCURRENCY, else the CPU count.",
+    )
+    parser.add_argument(
+        "--loop",
+        choices=("auto", "asyncio", "uvloop"),
+        default="auto",
+        help="Event loop; auto uses uvloop when installed.",
+    )
+    parser.add_argument(
+        "--http",
+        choices=("auto", "h11", "httptools"),
+        default="auto",
+        help="HTTP parser; auto uses httptools when installed.",
+    )
+    parser.add_argument(
+        "--keep-alive-timeout",
+        type=int,
+        default=5,
+        help="Seconds an idle keep-alive connection stays open. Keep it above the "
+        "idle timeout of any load balancer in front.",
+    )
+    parser.add_argument(
+        "--limit-concurrency",
+        type=int,
+        default=None,
+        help="Per worker, answer 503 past this many concurrent connections and "
+        "tasks. Unlimited by default.",
+    )
+    parser.add_argument(
+        "--backlog",
+        type=int,
+        default=2048,
+        help="Connections the kernel queues before the workers accept them.",
+    )
+    parser.add_argument(
+        "--graceful-shutdown-timeout",
+        type=int,
+        default=30,
+        help="Seconds to let in-flight requests finish on shutdown.",
+    )
+    parser.add_argument(
+        "--forwarded-allow-ips",
+        default=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        help="Comma-separated addresses of the reverse proxies trusted to set "
+        "X-Forwarded-For and X-Forwarded-Proto, or * to trust any. Requests from "
+        "them get the client address from the header, which login throttling "
+        "counts attempts by. Defaults to FORWARDED_ALLOW_IPS, else 127.0.0.1.",
+    )
+    parser.add_argument(
+        "--access-log",
+        action="store_true",
+        help="Log every request; off by default, as /metrics counts them.",
+    )
+    parser.add_argument("--log-level", default="info")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+    Serves the API until interrupted.
+
+    Args:
+        argv (list[str] | None, optional): The command line arguments. Defaults to
+            `sys.argv[1:]`.
+    """
+    # The workers load .env themselves; this applies it to the settings below.
+    load_dotenv()
+    args = parse_args(argv)
+    workers = args.workers or default_workers()
+
+    configure_workers(workers)
+    create_tables()
+
+    uvicorn.run(
+        f"{PACKAGE}.main:create_app",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop=args.loop,
+        http=args.http,
+        timeout_keep_alive=args.keep_alive_timeout,
+        limit_concurrency=args.limit_concurrency,
+        backlog=args.backlog,
+        proxy_headers=True,
+        forwarded_allow_ips=args.forwarded_allow_ips,
+        timeout_graceful_shutdown=args.graceful_shutdown_timeout,
+        access_log=args.access_log,
+        log_level=args.log_level,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Test helpers for keeping endpoint query counts and plans in check.
+
+Example:
+    with assert_query_budget(2, forbid_full_scans=True):
+        client.get("/users/me", headers=headers)
+"""
+from contextlib import contextmanager
+
+from sqlalchemy.engine import Engine
+
+from .database import engine as default_engine
+from .instrumentation import QueryStats, capture_queries
+
+
+def explain_query_plan(
+    statement: str, parameters, engine: Engine = default_engine
+) -> list[str]:
+    """
+    Returns the SQLite `EXPLAIN QUERY PLAN` detail lines for a statement.
+
+    Args:
+        statement (str): The SQL statement, with driver placeholders.
+        parameters (tuple | dict): The statement's parameters.
+        engine (Engine, optional): A sync engine on the same database. Defaults to
+            `database.engine`.
+
+    Returns:
+        list[str]: The plan's detail column, e.g. "SEARCH users USING INDEX ...".
+    """
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}", parameters
+        ).all()
+    return [row[-1] for row in rows]
+
+
+def full_scans(stats: QueryStats, engine: Engine = default_engine) -> list[str]:
+    """
+    Returns the full table scans done by the captured SELECT statements.
+
+    Args:
+        stats (QueryStats): Statements recorded by `capture_queries`.
+        engine (Engine, optional): A sync engine on the same database. Defaults to
+            `database.engine`.
+
+    Returns:
+        list[str]: One "<plan line>: <statement>" entry per full scan.
+    """
+    scans = []
+    for statement, parameters, _ in stats.statements:
+        if not statement.lstrip().upper().startswith("SELECT"):
+            continue
+        if isinstance(parameters, list):
+            continue
+        for line in explain_query_plan(statement, parameters, engine):
+            if line.startswith("SCAN") and "INDEX" not in line:
+                scans.append(f"{line}: {statement}")
+    return scans
+
+
+@contextmanager
+def assert_query_budget(
+    max_queries: int,
+    forbid_full_scans: bool = False,
+    engine: Engine = default_engine,
+):
+    """
+    Fails if the block runs more than `max_queries` statements, or, optionally, if
+    any of its SELECT statements scans a whole table.
+
+    Args:
+        max_queries (int): The maximum number of statements allowed.
+        forbid_full_scans (bool, optional): Whether to check each SELECT's query
+            plan for full table scans. Only supported on SQLite. Defaults to False.
+        engine (Engine, optional): A sync engine on the same database, used to run
+            `EXPLAIN QUERY PLAN`. Defaults to `database.engine`.
+
+    Yields:
+        QueryStats: The statements recorded so far.
+
+    Raises:
+        AssertionError: If the budget or the plan check fails.
+    """
+    with capture_queries() as stats:
+        yield stats
+
+    statements = "\n".join(statement for statement, _, _ in stats.statements)
+    assert (
+        stats.count <= max_queries
+    ), f"Expected at most {max_queries} queries, got {stats.count}:\n{statements}"
+
+    if forbid_full_scans:
+        scans = full_scans(stats, engine)
+        assert not scans, "Full table scans:\n" + "\n".join(scans)
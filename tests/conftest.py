@@ -0,0 +1,45 @@
+"""
+Runs the tests against a fresh SQLite database in a temporary directory.
+
+The configuration is read when the modules are imported, so it is set here, before
+anything imports the application.
+"""
+import os
+import tempfile
+
+_directory = tempfile.mkdtemp(prefix="assistant_api_tests_")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(_directory, 'assistant.db')}",
+    DB_CREATE_ALL="true",
+    BCRYPT_ROUNDS="4",
+    PASSWORD_HASH_WORKERS="0",
+    LOGIN_THROTTLING="false",
+    # Keeps the background poll of revoked tokens out of the measured requests.
+    REVOCATION_REFRESH_SECONDS="3600",
+)
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from ..main import create_app  # noqa: E402
+
+PASSWORD = "correct horse battery staple"
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(create_app()) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def user(client):
+    response = client.post(
+        "/signup",
+        data={"username": "alice", "password": PASSWORD, "email": "alice@example.com"},
+    )
+    assert response.status_code == 200, response.text
+    return {
+        "username": "alice",
+        "headers": {"Authorization": f"Bearer {response.json()['access_token']}"},
+    }
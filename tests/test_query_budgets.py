@@ -0,0 +1,94 @@
+"""
+Pins the number of SQL statements the hot endpoints run, so that a change adding
+queries to them fails here rather than in production.
+"""
+from datetime import date, timedelta
+
+import pytest
+
+from ..auth import principal_cache
+from ..crud.settings import settings_cache
+from ..testing import assert_query_budget
+from .conftest import PASSWORD
+
+
+@pytest.fixture(scope="module")
+def meal_plans(client, user):
+    response = client.post(
+        "/meals/bulk",
+        headers=user["headers"],
+        json=[{"name": f"Meal {i}", "meal_type": "lunch"} for i in range(3)],
+    )
+    meal_ids = [item["id"] for item in response.json()["items"]]
+    start = date(2024, 1, 1)
+    response = client.post(
+        "/mealplans/bulk",
+        headers=user["headers"],
+        json=[
+            {
+                "date": (start + timedelta(days=day)).isoformat(),
+                "meal_type": "lunch",
+                "lunch_id": meal_ids[day % 3],
+                "snack_ids": meal_ids[:2],
+            }
+            for day in range(28)
+        ],
+    )
+    assert response.json()["created"] == 28
+    return {"start_date": "2024-01-01T00:00:00", "end_date": "2024-01-28T00:00:00"}
+
+
+def test_users_me_cold(client, user):
+    principal_cache.clear()
+    with assert_query_budget(1, forbid_full_scans=True):
+        response = client.get("/users/me", headers=user["headers"])
+    assert response.status_code == 200
+
+
+def test_users_me_cached(client, user):
+    client.get("/users/me", headers=user["headers"])
+    with assert_query_budget(0):
+        response = client.get("/users/me", headers=user["headers"])
+    assert response.status_code == 200
+
+
+def test_login(client, user):
+    with assert_query_budget(1, forbid_full_scans=True):
+        response = client.post(
+            "/login", data={"username": user["username"], "password": PASSWORD}
+        )
+    assert response.status_code == 200
+
+
+def test_settings_cached(client, user):
+    client.get("/users/me/settings", headers=user["headers"])
+    with assert_query_budget(0):
+        response = client.get("/users/me/settings", headers=user["headers"])
+    assert response.status_code == 200
+
+
+def test_settings_cold(client, user):
+    settings_cache.clear()
+    with assert_query_budget(1, forbid_full_scans=True):
+        response = client.get("/users/me/settings", headers=user["headers"])
+    assert response.status_code == 200
+
+
+def test_meal_plans(client, user, meal_plans):
+    with assert_query_budget(2, forbid_full_scans=True):
+        response = client.get("/mealplans/", headers=user["headers"], params=meal_plans)
+    assert response.status_code == 200
+    assert len(response.json()) == 28
+
+
+def test_meal_plans_not_modified(client, user, meal_plans):
+    etag = client.get(
+        "/mealplans/", headers=user["headers"], params=meal_plans
+    ).headers["etag"]
+    with assert_query_budget(1, forbid_full_scans=True):
+        response = client.get(
+            "/mealplans/",
+            headers=user["headers"] | {"If-None-Match": etag},
+            params=meal_plans,
+        )
+    assert response.status_code == 304